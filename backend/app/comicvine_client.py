@@ -1,24 +1,77 @@
 #comicvine_client.py
 from __future__ import annotations
-import os
+import logging
+import random
 import time
-import math
-from typing import Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
 
-from .config import CV_API_KEY, CV_BASE_URL
+from .config import (
+    CV_API_KEY, CV_BASE_URL, CV_CONCURRENCY, CV_MAX_RETRIES, CV_BACKOFF_BASE, CV_BACKOFF_MAX,
+)
+from . import metrics, ratelimit
+
+log = logging.getLogger(__name__)
 
 #user agent to help identify api requests to ComicVine api
 UA = "comic-finder/1.0 (+student project)"
 #error exceptions
 class CVError(RuntimeError):
     pass
+#HTTP codes worth retrying: ComicVine throttles with 420 (sometimes 429), plus server errors
+RETRY_STATUS = {420, 429, 500, 502, 503, 504}
+#ComicVine's JSON status_code for "rate limit exceeded"
+CV_RATE_LIMITED = 107
+#one pooled keep-alive session shared by every thread, sized to the concurrency cap
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+#caps requests in flight no matter how many threads are calling _get
+_inflight = threading.BoundedSemaphore(CV_CONCURRENCY)
+#worker threads for volume batches
+_volume_pool = ThreadPoolExecutor(max_workers=CV_CONCURRENCY, thread_name_prefix="cv-volumes")
+
+def _http() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CV_CONCURRENCY)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers["User-Agent"] = UA
+                _session = s
+    return _session
 #checks if api keys are missing
 def _assert_key() -> None:
     if not CV_API_KEY:
         raise CVError("CV_API_KEY missing")
+#seconds to wait before retry number `attempt` (0-based): full jitter over an
+#exponential cap, but never less than what the server asked for in Retry-After
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    delay = random.uniform(0, min(CV_BACKOFF_MAX, CV_BACKOFF_BASE * (2 ** attempt)))
+    try:
+        return max(delay, min(CV_BACKOFF_MAX, float(retry_after))) if retry_after else delay
+    except ValueError:
+        return delay
+#one request, no retries; returns (response or None, metrics status label)
+def _send(url: str, params: Dict[str, Any], resource: str) -> tuple[Optional[requests.Response], str]:
+    ratelimit.acquire(resource)
+    t0 = time.perf_counter()
+    try:
+        with _inflight:
+            r = _http().get(url, params=params, timeout=30)
+    except (requests.ConnectionError, requests.Timeout):
+        return None, "error"
+    finally:
+        metrics.cv_duration.observe(time.perf_counter() - t0, resource)
+    return r, str(r.status_code)
 #get request for api pulls
-#returns JSON from api
+#returns JSON from api; throttling, 5xx and network errors are retried with backoff
 def _get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
     _assert_key()
     url = f"{CV_BASE_URL.rstrip('/')}/{path.lstrip('/')}"
@@ -27,13 +80,33 @@ def _get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
         "format": "json",
     }
     base.update(params or {})
-    r = requests.get(url, params=base, headers={"User-Agent": UA}, timeout=30)
-    if r.status_code != 200:
-        raise CVError(f"HTTP {r.status_code} for {url}: {r.text[:200]}")
-    data = r.json()
-    if data.get("status_code") != 1:  # success per ComicVine
-        raise CVError(f"ComicVine error: {data.get('error') or data}")
-    return data
+    resource = path.strip("/").split("/")[0] or "root"
+    for attempt in range(CV_MAX_RETRIES + 1):
+        r, status = _send(url, base, resource)
+        data: Dict[str, Any] = {}
+        if r is not None and r.status_code == 200:
+            data = r.json()
+            if data.get("status_code") != 1:  # success per ComicVine
+                status = f"cv_{data.get('status_code')}"
+        metrics.cv_requests.inc(resource, status)
+        if status == "200":
+            return data
+
+        throttled = r is not None and (r.status_code in (420, 429) or data.get("status_code") == CV_RATE_LIMITED)
+        retryable = r is None or throttled or r.status_code in RETRY_STATUS
+        if not retryable or attempt == CV_MAX_RETRIES:
+            if r is None:
+                raise CVError(f"Request to {url} failed after {attempt + 1} attempts")
+            if r.status_code != 200:
+                raise CVError(f"HTTP {r.status_code} for {url}: {r.text[:200]}")
+            raise CVError(f"ComicVine error: {data.get('error') or data}")
+        if throttled:
+            ratelimit.drain(resource)
+        delay = _backoff(attempt, r.headers.get("Retry-After") if r is not None else None)
+        log.warning("ComicVine %s returned %s, retry %d/%d in %.1fs",
+                    resource, status, attempt + 1, CV_MAX_RETRIES, delay)
+        time.sleep(delay)
+    raise CVError(f"Request to {url} failed")  # not reached
 #pulls list of comics from api within a set range of dates (ie. 8/5-8/12)
 def fetch_issues_by_date_range(
     start_iso: str,
@@ -42,14 +115,22 @@ def fetch_issues_by_date_range(
     date_field: str,  
     limit: int = 100,
     offset: int = 0,
+    updated_since: Optional[datetime] = None,
+    volume_ids: Optional[List[int]] = None,
 ) -> Dict[str, Any]:
     """
     GET /issues/ with a date range filter; sorted by the same date field.
+    With updated_since, only issues changed after that time (date_last_updated).
+    With volume_ids, only issues of those volumes.
     """
     if date_field not in ("store_date", "cover_date"):
         raise CVError("date_field must be store_date or cover_date")
 
     filters = f"{date_field}:{start_iso}|{end_iso}"
+    if updated_since is not None:
+        filters += f",date_last_updated:{updated_since:%Y-%m-%d %H:%M:%S}|2099-12-31 23:59:59"
+    if volume_ids:
+        filters += ",volume:" + "|".join(str(v) for v in volume_ids)
 
     params = {
         "filter": filters,
@@ -63,12 +144,25 @@ def fetch_issues_by_date_range(
         "offset": offset,
     }
     return _get("/issues/", params)
+#GET /volumes/ changed (or created) since `since`, oldest change first
+def fetch_volumes_updated_since(since: datetime, *, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+    params = {
+        "filter": f"date_last_updated:{since:%Y-%m-%d %H:%M:%S}|2099-12-31 23:59:59",
+        "sort": "date_last_updated:asc",
+        "field_list": "id,name,publisher,date_last_updated",
+        "limit": limit,
+        "offset": offset,
+    }
+    return _get("/volumes/", params)
+#max ids per /volumes/ call
+VOLUME_BATCH = 50
 #this function was created with the help of AI. 
 #the function allows for pulling volumes (completed stories instead of single issues)
 def fetch_volumes_by_ids(ids: List[int]) -> Dict[int, Dict[str, Any]]:
     """
-    Return {volume_id: {'publisher': {'name': 'Marvel'}}}
+    Return {volume_id: {'id': 1, 'name': 'X-Men', 'publisher': {'name': 'Marvel'}}}
     We batch to <= 50 ids per call using /volumes/ with filter=id:id1,id2,...
+    Batches run concurrently on the volume pool (bounded by CV_CONCURRENCY).
     """
     out: Dict[int, Dict[str, Any]] = {}
     if not ids:
@@ -81,18 +175,24 @@ def fetch_volumes_by_ids(ids: List[int]) -> Dict[int, Dict[str, Any]]:
             uniq.append(i)
             seen.add(i)
 
-    BATCH = 50
-    for i in range(0, len(uniq), BATCH):
-        chunk = uniq[i:i+BATCH]
+    BATCH = VOLUME_BATCH
+    chunks = [uniq[i:i+BATCH] for i in range(0, len(uniq), BATCH)]
+
+    def _one(chunk: List[int]) -> List[Dict[str, Any]]:
         params = {
             "filter": "id:" + ",".join(str(x) for x in chunk),
-            "field_list": "id,publisher",
+            "field_list": "id,name,publisher",
             "limit": BATCH,
         }
-        data = _get("/volumes/", params)
-        for v in data.get("results", []):
+        return _get("/volumes/", params).get("results", [])
+
+    if len(chunks) == 1:
+        batches = [_one(chunks[0])]
+    else:
+        batches = list(_volume_pool.map(_one, chunks))
+    for results in batches:
+        for v in results:
             vid = v.get("id")
             if isinstance(vid, int):
                 out[vid] = v
-        time.sleep(0.15)
     return out
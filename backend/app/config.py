@@ -24,10 +24,82 @@ _load_envs()
 
 #database connection for SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./comics.db")
+#connection pool per engine (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+#read routes use an async engine (aiosqlite / asyncpg): "auto" = if the driver is installed
+DB_ASYNC = os.getenv("DB_ASYNC", "auto").lower()
+#SQLite page cache and memory-mapped I/O per connection, in MB
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
 
 # ComicVine API configs. 
 CV_API_KEY  = os.getenv("CV_API_KEY") or os.getenv("COMICVINE_API_KEY")
 CV_BASE_URL = os.getenv("CV_BASE_URL", "https://comicvine.gamespot.com/api")
+#max ComicVine requests in flight at once (pages + volume batches combined)
+CV_CONCURRENCY = max(1, int(os.getenv("CV_CONCURRENCY", "4")))
+#ComicVine allows ~200 requests per resource (/issues/, /volumes/) per hour
+#the budget is a token bucket shared by every process through this SQLite file
+#(0 = no limit); CV_RATE_BURST is how many requests may go out back to back
+CV_RATE_PER_HOUR = float(os.getenv("CV_RATE_PER_HOUR", "200"))
+CV_RATE_BURST = float(os.getenv("CV_RATE_BURST", os.getenv("CV_RATE_PER_HOUR", "200")))
+CV_RATE_DB = os.getenv("CV_RATE_DB", "./cv_ratelimit.db")
+#retries for throttled (420/429) and 5xx responses, with jittered exponential backoff
+CV_MAX_RETRIES = int(os.getenv("CV_MAX_RETRIES", "5"))
+CV_BACKOFF_BASE = float(os.getenv("CV_BACKOFF_BASE", "1.0"))
+CV_BACKOFF_MAX = float(os.getenv("CV_BACKOFF_MAX", "120"))
+#background sync jobs that may run at the same time (different months)
+SYNC_WORKERS = max(1, int(os.getenv("SYNC_WORKERS", "1")))
+#auto-sync skips a month that was fully synced within this many hours
+SYNC_FRESHNESS_HOURS = float(os.getenv("SYNC_FRESHNESS_HOURS", "12"))
+#if set, every sync also saves the raw ComicVine pages here as gzipped NDJSON
+#(python -m app.snapshot import ... loads them back without the API)
+SYNC_SNAPSHOT_DIR = os.getenv("SYNC_SNAPSHOT_DIR", "")
+#volume -> publisher cache: how long a cached volume stays fresh, and how many stay in memory
+CV_VOLUME_TTL_DAYS = float(os.getenv("CV_VOLUME_TTL_DAYS", "30"))
+CV_VOLUME_CACHE_SIZE = int(os.getenv("CV_VOLUME_CACHE_SIZE", "20000"))
+#a volume ComicVine left out of a response is asked for again after this many hours
+CV_VOLUME_MISS_TTL_HOURS = float(os.getenv("CV_VOLUME_MISS_TTL_HOURS", "6"))
+#publisher whose books are kept (case-insensitive substring of the volume's publisher)
+CV_PUBLISHER = os.getenv("CV_PUBLISHER", "Marvel").strip()
+#"full" crawls every issue in a range and filters by publisher; "targeted" asks
+#/issues/ only for the publisher's active volumes when that is cheaper (see volume_index.py)
+SYNC_MODE = os.getenv("SYNC_MODE", "full").lower()
+#a volume counts as active for a range if ComicVine updated it this many days before the range starts
+CV_VOLUME_ACTIVE_DAYS = float(os.getenv("CV_VOLUME_ACTIVE_DAYS", "180"))
+#how far back the first /volumes/ refresh of the index reaches
+CV_VOLUME_BOOTSTRAP_DAYS = float(os.getenv("CV_VOLUME_BOOTSTRAP_DAYS", "365"))
+#/volumes/ requests one refresh run may make; a refresh that needs more stops
+#there and carries on after CV_VOLUME_REFRESH_PAUSE_MINUTES, leaving the rest
+#of the shared ComicVine budget to syncs
+CV_VOLUME_REFRESH_MAX_CALLS = max(1, int(os.getenv("CV_VOLUME_REFRESH_MAX_CALLS", "50")))
+CV_VOLUME_REFRESH_PAUSE_MINUTES = float(os.getenv("CV_VOLUME_REFRESH_PAUSE_MINUTES", "60"))
+
+#response cache for the read routes: total size of cached bodies, and the
+#max-age sent with them (clients revalidate with If-None-Match after that)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_MAX_AGE = int(os.getenv("RESPONSE_MAX_AGE", "0"))
+
+#list routes build plain dicts from the SQL rows and skip per-row model
+#validation (orjson encodes them when installed); 0 goes back to the models
+FAST_JSON = os.getenv("FAST_JSON", "1").lower() not in ("0", "false", "no")
+#responses at least this big are gzipped for clients that accept it (0 = never)
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+
+#local cover image cache (/api/covers): where files go, the size cap, and
+#whether the sync downloads covers for the rows it writes
+COVER_CACHE_DIR = os.getenv("COVER_CACHE_DIR", "./cover_cache")
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+COVER_PREFETCH = os.getenv("COVER_PREFETCH", "1").lower() not in ("0", "false", "no")
+
+#stored descriptions are plain text cut to this many characters (the HTML is kept compressed)
+DESCRIPTION_MAX_CHARS = int(os.getenv("DESCRIPTION_MAX_CHARS", "1000"))
+
+#most series the in-memory autocomplete index holds (the ones with the most issues win)
+SUGGEST_MAX_SERIES = int(os.getenv("SUGGEST_MAX_SERIES", "50000"))
+
+#log SQL statements slower than this many ms (0 = off); see /metrics
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
 
 #cross origin function was created with the help of AI
 #this function helps tell the backend which frontend URL to call 
@@ -0,0 +1,83 @@
+#coverage.py
+#ledger of completed syncs (sync_coverage table)
+#used to skip auto-syncs for ranges that were crawled recently, and to turn
+#repeat syncs into "what changed since last time" crawls
+#unfinished passes leave a checkpoint (sync_checkpoint) so they can be resumed
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlmodel import Session, func, select
+
+from .config import SYNC_FRESHNESS_HOURS
+from .db import engine
+from .models import SyncCheckpoint, SyncCoverage
+
+DATE_FIELDS = ("store_date", "cover_date")
+#ComicVine's date_last_updated isn't UTC, so incremental syncs look back a bit further
+INCREMENTAL_OVERLAP = timedelta(days=1)
+#older checkpoints are ignored: ComicVine's result order may have shifted since
+CHECKPOINT_MAX_AGE = timedelta(hours=24)
+
+#when the most recent sync covering all of [start, end] for this field started
+def last_covered(start: date, end: date, date_field: str) -> Optional[datetime]:
+    with Session(engine) as s:
+        return s.exec(
+            select(func.max(SyncCoverage.synced_at)).where(
+                SyncCoverage.date_field == date_field,
+                SyncCoverage.start_date <= start,
+                SyncCoverage.end_date >= end,
+            )
+        ).one()
+
+#cutoff for an incremental sync of [start, end], or None if it was never covered
+def updated_since(start: date, end: date, date_field: str) -> Optional[datetime]:
+    last = last_covered(start, end, date_field)
+    return last - INCREMENTAL_OVERLAP if last else None
+
+#True if every date field of [start, end] was synced within the freshness window
+def is_fresh(start: date, end: date, window_hours: float = SYNC_FRESHNESS_HOURS) -> bool:
+    cutoff = datetime.utcnow() - timedelta(hours=window_hours)
+    for field in DATE_FIELDS:
+        last = last_covered(start, end, field)
+        if last is None or last < cutoff:
+            return False
+    return True
+
+#records a finished pass and drops its checkpoint
+def record(start: date, end: date, date_field: str, started_at: datetime) -> None:
+    with Session(engine) as s:
+        s.add(SyncCoverage(start_date=start, end_date=end, date_field=date_field, synced_at=started_at))
+        for cp in s.exec(_checkpoint_query(start, end, date_field)).all():
+            s.delete(cp)
+        s.commit()
+
+def _checkpoint_query(start: date, end: date, date_field: str):
+    return select(SyncCheckpoint).where(
+        SyncCheckpoint.start_date == start,
+        SyncCheckpoint.end_date == end,
+        SyncCheckpoint.date_field == date_field,
+    )
+
+#offset to resume an interrupted pass from (0 if there's nothing to resume)
+#a checkpoint only applies to a pass with the same incremental cutoff
+def resume_offset(start: date, end: date, date_field: str, since: Optional[datetime]) -> int:
+    cutoff = datetime.utcnow() - CHECKPOINT_MAX_AGE
+    with Session(engine) as s:
+        cp = s.exec(_checkpoint_query(start, end, date_field)).first()
+    if cp is None or cp.updated_at < cutoff or cp.updated_since != since:
+        return 0
+    return cp.next_offset
+
+#saves progress in the caller's session, so it commits together with the page it describes
+def checkpoint(
+    session: Session, start: date, end: date, date_field: str,
+    since: Optional[datetime], next_offset: int,
+) -> None:
+    cp = session.exec(_checkpoint_query(start, end, date_field)).first()
+    if cp is None:
+        cp = SyncCheckpoint(start_date=start, end_date=end, date_field=date_field, updated_at=datetime.utcnow())
+    cp.updated_since = since
+    cp.next_offset = next_offset
+    cp.updated_at = datetime.utcnow()
+    session.add(cp)
@@ -0,0 +1,208 @@
+#covers.py
+#local cache of cover images so the grid doesn't hot-link ComicVine's CDN
+#files are stored content-addressed (objects/ab/abcdef...) and the CoverBlob
+#table maps (source url, variant) -> digest; the least recently used entries
+#are evicted once the cache is over COVER_CACHE_MAX_BYTES
+#resized variants need Pillow (in requirements.txt); a variant that resizing
+#doesn't change (small originals, no Pillow) gets no row of its own and is
+#served from the original's, so the file isn't stored or counted twice
+from __future__ import annotations
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from sqlmodel import Session, func, select
+
+from .config import COVER_CACHE_DIR, COVER_CACHE_MAX_BYTES, CV_CONCURRENCY
+from .db import engine
+from .models import CoverBlob
+from .comicvine_client import UA
+
+try:
+    from PIL import Image
+except ImportError:  # optional
+    Image = None
+
+#variant -> max width in px (None = original)
+VARIANTS: Dict[str, Optional[int]] = {"thumb": 160, "card": 320, "full": None}
+DEFAULT_VARIANT = "card"
+#the variant that is the downloaded image itself
+ORIGINAL_VARIANT = "full"
+#only rewrite accessed_at when it's older than this (keeps reads from writing)
+TOUCH_EVERY = timedelta(hours=1)
+#eviction goes down to this fraction of the cap, so it doesn't run on every download
+EVICT_TO = 0.9
+#rows loaded per eviction round
+EVICT_BATCH = 200
+
+log = logging.getLogger(__name__)
+
+class CoverError(RuntimeError):
+    pass
+
+_root = Path(COVER_CACHE_DIR)
+_http = requests.Session()
+_http.headers["User-Agent"] = UA
+_prefetch_pool = ThreadPoolExecutor(max_workers=CV_CONCURRENCY, thread_name_prefix="cover-prefetch")
+#striped locks so one url is only downloaded once at a time (prefetch and a page view can race)
+_url_locks = [threading.Lock() for _ in range(64)]
+_total: Optional[int] = None
+_total_lock = threading.Lock()
+
+def _key(url: str, variant: str) -> str:
+    return f"{variant}|{url}"
+
+def _path(digest: str) -> Path:
+    return _root / "objects" / digest[:2] / digest
+
+def _url_lock(url: str) -> threading.Lock:
+    return _url_locks[hash(url) % len(_url_locks)]
+
+def _resize(data: bytes, width: Optional[int]) -> Tuple[bytes, Optional[str]]:
+    if width is None or Image is None:
+        return data, None
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            if im.width <= width:
+                return data, None
+            im = im.convert("RGB")
+            im.thumbnail((width, width * 4))
+            out = io.BytesIO()
+            im.save(out, format="JPEG", quality=85, optimize=True)
+            return out.getvalue(), "image/jpeg"
+    except Exception:
+        #not something Pillow can read; serve it untouched
+        return data, None
+
+def _write_blob(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    path = _path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+    return digest
+
+#download `url` once and store every variant of it
+def _fetch_all_variants(url: str) -> None:
+    r = _http.get(url, timeout=30)
+    if r.status_code != 200:
+        raise CoverError(f"HTTP {r.status_code} for {url}")
+    original_type = r.headers.get("Content-Type", "image/jpeg").split(";")[0]
+    now = datetime.utcnow()
+    rows = []
+    for variant, width in VARIANTS.items():
+        data, content_type = _resize(r.content, width)
+        if content_type is None and variant != ORIGINAL_VARIANT:
+            continue
+        digest = _write_blob(data)
+        rows.append(CoverBlob(
+            key=_key(url, variant), digest=digest, size=len(data),
+            content_type=content_type or original_type, accessed_at=now,
+        ))
+    with Session(engine) as s:
+        replaced = s.exec(
+            select(func.coalesce(func.sum(CoverBlob.size), 0))
+            .where(CoverBlob.key.in_([row.key for row in rows]))
+        ).one()
+        for row in rows:
+            s.merge(row)
+        s.commit()
+    _grow(sum(row.size for row in rows) - replaced)
+
+def _cache_bytes(s: Session) -> int:
+    return s.exec(select(func.coalesce(func.sum(CoverBlob.size), 0))).one()
+
+#running total of CoverBlob.size in this process (None until first needed);
+#other processes write to the cache too, so it's only trusted to say "still
+#under the cap": past the cap it's recounted before anything is evicted
+def _grow(delta: int) -> None:
+    global _total
+    with _total_lock:
+        if _total is None:
+            with Session(engine) as s:
+                _total = _cache_bytes(s)
+        else:
+            _total += delta
+        over = _total > COVER_CACHE_MAX_BYTES
+    if over:
+        _evict()
+
+#drop least recently used entries (and unreferenced files) until under the
+#low-water mark, a batch of the oldest rows at a time
+def _evict() -> None:
+    global _total
+    low_water = int(COVER_CACHE_MAX_BYTES * EVICT_TO)
+    with _total_lock, Session(engine) as s:
+        total = _cache_bytes(s)
+        while total > low_water:
+            victims = s.exec(select(CoverBlob).order_by(CoverBlob.accessed_at).limit(EVICT_BATCH)).all()
+            if not victims:
+                break
+            for row in victims:
+                if total <= low_water:
+                    break
+                total -= row.size
+                s.delete(row)
+                s.flush()
+                still_used = s.exec(select(CoverBlob.key).where(CoverBlob.digest == row.digest)).first()
+                if not still_used:
+                    _path(row.digest).unlink(missing_ok=True)
+            s.commit()
+        _total = total
+
+#the variant's row, or the original's when resizing didn't make one
+def _lookup(url: str, variant: str) -> Optional[CoverBlob]:
+    with Session(engine) as s:
+        row = s.get(CoverBlob, _key(url, variant))
+        if row is None and variant != ORIGINAL_VARIANT:
+            row = s.get(CoverBlob, _key(url, ORIGINAL_VARIANT))
+        if row is None or not _path(row.digest).exists():
+            return None
+        if datetime.utcnow() - row.accessed_at > TOUCH_EVERY:
+            row.accessed_at = datetime.utcnow()
+            s.add(row)
+            s.commit()
+            s.refresh(row)
+        s.expunge(row)
+        return row
+
+def get_cover(url: str, variant: str = DEFAULT_VARIANT) -> Tuple[Path, CoverBlob]:
+    """
+    Return (file path, CoverBlob) for a variant of the cover at `url`,
+    downloading it first if it isn't cached. Raises CoverError if the
+    download fails.
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown cover variant: {variant}")
+    row = _lookup(url, variant)
+    if row is None:
+        with _url_lock(url):
+            row = _lookup(url, variant)
+            if row is None:
+                try:
+                    _fetch_all_variants(url)
+                except requests.RequestException as e:
+                    raise CoverError(str(e)) from e
+                row = _lookup(url, variant)
+    if row is None:
+        raise CoverError(f"Cover not cached: {url}")
+    return _path(row.digest), row
+
+def _prefetch_one(url: str) -> None:
+    try:
+        get_cover(url, DEFAULT_VARIANT)
+    except Exception as e:
+        log.warning("Cover prefetch failed for %s: %r", url, e)
+
+#queue downloads for covers that aren't cached yet (returns right away)
+def prefetch(urls: Iterable[Optional[str]]) -> None:
+    for url in dict.fromkeys(u for u in urls if u):
+        _prefetch_pool.submit(_prefetch_one, url)
@@ -1,14 +1,119 @@
 #db.py
 from __future__ import annotations
-from sqlmodel import SQLModel, create_engine
-from .config import DATABASE_URL
+import importlib
+import logging
+from typing import Callable, TypeVar
+
+import anyio
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlmodel import SQLModel, Session, create_engine
+from .config import (
+    DATABASE_URL, DB_ASYNC, DB_MAX_OVERFLOW, DB_POOL_SIZE, SQLITE_CACHE_MB, SQLITE_MMAP_MB,
+)
+from .metrics import instrument_engine
+
+log = logging.getLogger(__name__)
+T = TypeVar("T")
+
+_url = make_url(DATABASE_URL)
+_sqlite = _url.get_backend_name() == "sqlite"
+_memory = _sqlite and _url.database in (None, "", ":memory:")
 #args are required for SQLite
 connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
+if _sqlite:
     connect_args = {"check_same_thread": False}
+#in-memory SQLite uses a single-connection pool that takes no size options
+pool_args = {} if _memory else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+
+#per-connection SQLite tuning: WAL lets readers keep going while the sync
+#writes, and synchronous=NORMAL is safe under WAL (only the last commits can
+#be lost on power failure, the file can't be corrupted)
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    if not _memory:
+        cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
+def _setup(e: Engine) -> Engine:
+    if _sqlite:
+        event.listen(e, "connect", _sqlite_pragmas)
+    instrument_engine(e)
+    return e
+
 #create db using URL
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
-## ensure comic models are imported
+engine = _setup(create_engine(DATABASE_URL, echo=False, connect_args=connect_args, **pool_args))
+
+#same database through an asyncio driver, for the read routes
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+#None if disabled, or (with DB_ASYNC=auto) if there's no async driver installed
+def _make_async_engine():
+    if DB_ASYNC in ("0", "false", "no", "off"):
+        return None
+    backend = _url.get_backend_name()
+    try:
+        driver = _ASYNC_DRIVERS.get(backend)
+        if driver is None:
+            raise ImportError(f"no async driver for {backend}")
+        importlib.import_module(driver)
+        from sqlalchemy.ext.asyncio import create_async_engine
+        e = create_async_engine(_url.set(drivername=f"{backend}+{driver}"), echo=False, **pool_args)
+    except ImportError as err:
+        if DB_ASYNC != "auto":
+            raise
+        log.info("async database path off: %s", err)
+        return None
+    _setup(e.sync_engine)
+    return e
+
+async_engine = _make_async_engine()
+
+#runs fn(session) for a read route without blocking the event loop: on the
+#async engine when there is one (AsyncSession.run_sync), otherwise on a worker thread
+async def read(fn: Callable[[Session], T]) -> T:
+    if async_engine is not None:
+        from sqlmodel.ext.asyncio.session import AsyncSession
+        async with AsyncSession(async_engine) as s:
+            return await s.run_sync(fn)
+
+    def _run() -> T:
+        with Session(engine) as s:
+            return fn(s)
+    return await anyio.to_thread.run_sync(_run)
+
+#create tables, then apply the schema migrations this database hasn't had
+#(migrations.py); the FTS/summary-table flags are read from what exists afterwards
 def init_db() -> None:
-    from .models import Comic 
+    from . import migrations, release_calendar, search_index, suggest
     SQLModel.metadata.create_all(engine)
+    migrations.run(engine)
+    search_index.detect(engine)
+    release_calendar.detect(engine)
+    suggest.detect(engine)
+#whether a SQLite table/trigger/index exists (always False on other databases)
+def has_sqlite_object(e: Engine, kind: str, name: str) -> bool:
+    if e.dialect.name != "sqlite":
+        return False
+    with e.connect() as conn:
+        return conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type=? AND name=?", (kind, name)
+        ).first() is not None
+#the database URL points at a backend the upserts below can't be written for
+class UnsupportedDatabase(RuntimeError):
+    pass
+
+#insert() with on_conflict_do_update/do_nothing for the bind's dialect (an
+#Engine or Connection); the upserts are written for SQLite and PostgreSQL only
+def upsert_insert(bind):
+    name = bind.dialect.name
+    if name == "postgresql":
+        return postgresql.insert
+    if name == "sqlite":
+        return sqlite.insert
+    raise UnsupportedDatabase(f"{name} isn't supported: syncs and migrations need SQLite or PostgreSQL")
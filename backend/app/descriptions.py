@@ -0,0 +1,119 @@
+#descriptions.py
+#ComicVine descriptions are HTML pages of their own (credits tables, cover
+#lists, images) and used to be stored as-is in comic.description. now the
+#row keeps two forms:
+#  description      - plain-text summary, at most DESCRIPTION_MAX_CHARS (display, FTS)
+#  description_html - the original HTML, zlib-compressed, read only by the details route
+#
+#existing databases are converted by migration 5 at startup (migrations.py);
+#running it by hand also VACUUMs, so the file actually shrinks
+#  cd backend
+#  python -m app.descriptions migrate
+from __future__ import annotations
+import argparse
+import html
+import json
+import re
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from . import response_cache
+from .config import DESCRIPTION_MAX_CHARS
+from .db import engine, init_db
+from .models import Comic
+
+#tags whose contents aren't part of the summary (credits/cover tables, section headings)
+SKIP_TAGS = ("table", "figure", "script", "style", "h1", "h2", "h3", "h4", "h5", "h6")
+#tags that end a paragraph
+BLOCK_TAGS = ("p", "div", "br", "li", "ul", "ol", "blockquote", "section", "tr")
+#rows per migration transaction
+MIGRATE_BATCH = 2000
+
+#regexes rather than html.parser: about 10x faster, and the summary doesn't need a real DOM
+_SKIP = re.compile(r"<(%s)\b.*?</\1\s*>" % "|".join(SKIP_TAGS), re.I | re.S)
+_BLOCK = re.compile(r"</?(?:%s)\b[^>]*>" % "|".join(BLOCK_TAGS), re.I)
+_TAG = re.compile(r"<[^>]*>|<!--.*?-->", re.S)
+
+#plain text of an HTML (or already plain) description, cut at a word boundary
+def to_text(raw: str, limit: int = DESCRIPTION_MAX_CHARS) -> Optional[str]:
+    text = _TAG.sub("", _BLOCK.sub("\n", _SKIP.sub("", raw)))
+    lines = (" ".join(line.split()) for line in html.unescape(text).split("\n"))
+    text = "\n".join(line for line in lines if line)
+    if len(text) > limit:
+        cut = text[:limit]
+        text = (cut[:cut.rfind(" ")] if " " in cut else cut).rstrip(" ,.;:") + "…"
+    return text or None
+
+def pack(raw: str) -> bytes:
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+def unpack(blob: Optional[bytes]) -> Optional[str]:
+    return zlib.decompress(blob).decode("utf-8") if blob else None
+
+_MARKUP = re.compile(r"<[a-zA-Z/!]|&\w+;|&#")
+
+#the comic columns for a raw description: the original is only kept when the
+#summary isn't the same text (it had markup or was cut)
+def columns(raw: Optional[str]) -> Dict[str, Any]:
+    if not raw:
+        return {"description": None, "description_html": None}
+    if not _MARKUP.search(raw) and len(raw) <= DESCRIPTION_MAX_CHARS:
+        return {"description": raw, "description_html": None}
+    return {"description": to_text(raw), "description_html": pack(raw)}
+
+#converts rows written before the split (HTML still in description)
+#rows that are already plain text are left as they are
+def migrate(e: Engine = engine, *, batch: int = MIGRATE_BATCH, vacuum: bool = True) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    stats = {"scanned": 0, "converted": 0}
+    stmt = (
+        update(Comic)
+        .where(Comic.id == bindparam("cid"))
+        .values(description=bindparam("text"), description_html=bindparam("html"))
+    )
+    last = 0
+    while True:
+        with Session(e) as s:
+            rows = s.exec(
+                select(Comic.id, Comic.description)
+                .where(Comic.id > last, Comic.description.is_not(None), Comic.description_html.is_(None))
+                .order_by(Comic.id)
+                .limit(batch)
+            ).all()
+        if not rows:
+            break
+        last = rows[-1][0]
+        stats["scanned"] += len(rows)
+        params = []
+        for cid, raw in rows:
+            cols = columns(raw)
+            if cols["description_html"] is not None:
+                params.append({"cid": cid, "text": cols["description"], "html": cols["description_html"]})
+        if params:
+            with e.begin() as conn:
+                conn.execute(stmt, params)
+                response_cache.bump(conn)
+            stats["converted"] += len(params)
+    if vacuum and stats["converted"] and e.dialect.name == "sqlite":
+        with e.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Comic description storage")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate", help="split stored HTML descriptions into text + compressed HTML")
+    p.add_argument("--no-vacuum", action="store_true", help="don't VACUUM afterwards (the file won't shrink)")
+    args = ap.parse_args()
+
+    init_db()
+    print(json.dumps(migrate(vacuum=not args.no_vacuum), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#export.py
+#streams catalog rows as NDJSON or CSV straight from a server-side cursor
+#rows come out of the database in partitions of EXPORT_BATCH and are written
+#out as they arrive, so memory use doesn't grow with the size of the range
+from __future__ import annotations
+import csv
+import io
+import json
+from typing import Iterator
+
+from sqlalchemy import select
+
+from .db import engine
+from .models import Comic
+
+EXPORT_BATCH = 1000
+#exported columns, in output order
+COLUMNS = (
+    "id", "marvel_id", "title", "author", "onsale_date", "format",
+    "thumbnail_url", "issue_number", "description",
+)
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def base_query():
+    table = Comic.__table__
+    return select(*(table.c[name] for name in COLUMNS))
+
+def _rows(stmt) -> Iterator[list]:
+    stmt = stmt.order_by(Comic.onsale_date, Comic.title, Comic.id)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH).execute(stmt)
+        for part in result.partitions():
+            yield part
+
+def ndjson(stmt) -> Iterator[bytes]:
+    for part in _rows(stmt):
+        lines = []
+        for row in part:
+            doc = dict(zip(COLUMNS, row))
+            if doc["onsale_date"] is not None:
+                doc["onsale_date"] = doc["onsale_date"].isoformat()
+            lines.append(json.dumps(doc, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def csv_rows(stmt) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for part in _rows(stmt):
+        writer.writerows(part)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+def stream(stmt, fmt: str) -> Iterator[bytes]:
+    return ndjson(stmt) if fmt == "ndjson" else csv_rows(stmt)
@@ -0,0 +1,84 @@
+#fastjson.py
+#JSON bodies and compression for the read routes
+#list routes hand plain dicts (projected straight from the SQL rows, see
+#main._select_cards) to dumps(), which uses orjson when it's installed and
+#the stdlib json module otherwise; either way the bytes match what FastAPI's
+#own JSONResponse sends for the declared response_model
+from __future__ import annotations
+import json
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import GZIP_MIN_BYTES
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+#responses under these paths are never gzipped (images are compressed already)
+NO_COMPRESS_PREFIXES = ("/api/covers/",)
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+#a route can return this to skip FastAPI's response_model validation and
+#encoding (the route's response_model still documents the shape in OpenAPI)
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+#whether Compress will gzip a body of `size` bytes for this request; routes
+#that answer 304s use it to send the same validator the 200 would carry
+def gzipped(request: Request, size: int) -> bool:
+    return (
+        0 < GZIP_MIN_BYTES <= size
+        and "gzip" in request.headers.get("accept-encoding", "")
+        and not request.url.path.startswith(NO_COMPRESS_PREFIXES)
+    )
+
+#the gzip and identity bodies are different bytes, so they can't share a strong ETag
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith("W/") else "W/" + etag
+
+#gzip for bodies of at least minimum_size bytes, except NO_COMPRESS_PREFIXES
+#every response it handles gets Vary: Accept-Encoding (304s and small bodies
+#too, so caches never hand a gzipped body to a client that didn't ask), and a
+#strong ETag on a gzipped body is made weak
+class Compress:
+    def __init__(self, app: ASGIApp, minimum_size: int, compresslevel: int = 6) -> None:
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(NO_COMPRESS_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and "content-encoding" in headers:
+                    headers["etag"] = weak_etag(etag)
+            await send(message)
+        await self.gzip(scope, receive, _send)
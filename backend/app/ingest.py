@@ -0,0 +1,148 @@
+#ingest.py
+#concurrent page fetching for the ComicVine sync
+#pages (and their volume lookups) are downloaded ahead on a thread pool while
+#the caller writes the current page, but they are always handed back in offset
+#order so the DB sees exactly the same sequence of writes as a serial crawl
+from __future__ import annotations
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from .config import CV_CONCURRENCY
+from .comicvine_client import fetch_issues_by_date_range, VOLUME_BATCH
+from .volume_cache import resolve_volumes
+
+PAGE_LIMIT = 100
+
+#one page of /issues/ ready to be written
+class Page(NamedTuple):
+    results: List[Dict[str, Any]]       # issues not skipped
+    volumes: Dict[int, Dict[str, Any]]  # volume info for those issues
+    skipped: int                        # issues dropped because they were already handled
+    offset: int = 0                     # /issues/ offset this page was requested at
+
+#unique volume ids for a page of issues (keeps first-seen order)
+def page_volume_ids(results: List[Dict[str, Any]]) -> List[int]:
+    vol_ids = [
+        (it.get("volume") or {}).get("id")
+        for it in results
+        if (it.get("volume") or {}).get("id")
+    ]
+    return list(dict.fromkeys(vol_ids))
+
+#volume lookups shared by every page (and every pass) of one sync run
+#each id is looked up at most once, even when several page workers need it at
+#the same time; the lookup itself goes through the persistent volume cache
+class VolumeResolver:
+    def __init__(self) -> None:
+        self._known: Dict[int, Dict[str, Any]] = {}
+        self._pending: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.api_calls = 0
+
+    def _fetch(self, ids: List[int]) -> None:
+        got, fetched = resolve_volumes(ids)
+        with self._lock:
+            self.api_calls += math.ceil(fetched / VOLUME_BATCH)
+            for vid in ids:
+                #unknown volumes are remembered too so they aren't asked for again
+                self._known[vid] = got.get(vid) or {}
+
+    def resolve(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            mine = [i for i in ids if i not in self._known and i not in self._pending]
+            waits = {self._pending[i] for i in ids if i in self._pending}
+            done = threading.Event()
+            for i in mine:
+                self._pending[i] = done
+        try:
+            if mine:
+                self._fetch(mine)
+        finally:
+            with self._lock:
+                for i in mine:
+                    self._pending.pop(i, None)
+            done.set()
+        for ev in waits:
+            ev.wait()
+        #another worker's fetch may have failed; ask for those ourselves
+        with self._lock:
+            missing = [i for i in ids if i not in self._known]
+        if missing:
+            self._fetch(missing)
+        with self._lock:
+            return {i: self._known[i] for i in ids if self._known.get(i)}
+
+#one page of issues plus the volume info needed to filter it by publisher
+def _fetch_page(
+    start_iso: str, end_iso: str, date_field: str, limit: int, offset: int,
+    volumes: VolumeResolver, skip: Set[int], updated_since: Optional[datetime],
+    volume_ids: Optional[List[int]],
+) -> tuple[Dict[str, Any], Page]:
+    payload = fetch_issues_by_date_range(
+        start_iso, end_iso, date_field=date_field, limit=limit, offset=offset,
+        updated_since=updated_since, volume_ids=volume_ids,
+    )
+    raw = payload.get("results", [])
+    results = [it for it in raw if it.get("id") not in skip] if skip else raw
+    vol_ids = page_volume_ids(results)
+    vol_map = volumes.resolve(vol_ids) if vol_ids else {}
+    return payload, Page(results, vol_map, len(raw) - len(results), offset)
+
+def iter_issue_pages(
+    start_iso: str,
+    end_iso: str,
+    *,
+    date_field: str,
+    limit: int = PAGE_LIMIT,
+    prefetch: int = CV_CONCURRENCY,
+    volumes: Optional[VolumeResolver] = None,
+    skip: Optional[Set[int]] = None,
+    updated_since: Optional[datetime] = None,
+    start_offset: int = 0,
+    volume_ids: Optional[List[int]] = None,
+) -> Iterator[Page]:
+    """
+    Yield a Page for every page of /issues/ in the range, in offset order.
+    The first page tells us the total; after that up to `prefetch` pages are in flight
+    while the consumer is busy with the current one.
+    Issues whose id is in `skip` are dropped before any volume lookup.
+    With updated_since only issues changed after that time are requested.
+    start_offset resumes a crawl part way through (see coverage.resume_offset).
+    volume_ids limits the crawl to issues of those volumes.
+    """
+    volumes = volumes if volumes is not None else VolumeResolver()
+    skip = skip if skip is not None else set()
+    pool = ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix="cv-pages")
+    pending: Deque[Future] = deque()
+
+    def _submit(off: int) -> Future:
+        return pool.submit(
+            _fetch_page, start_iso, end_iso, date_field, limit, off, volumes, skip, updated_since,
+            volume_ids,
+        )
+
+    try:
+        payload, page = _submit(start_offset).result()
+        total = payload.get("number_of_total_results", 0)
+        offsets = iter(range(start_offset + limit, total, limit))
+
+        def _schedule() -> None:
+            off = next(offsets, None)
+            if off is not None:
+                pending.append(_submit(off))
+
+        for _ in range(max(1, prefetch)):
+            _schedule()
+        yield page
+        while pending:
+            fut = pending.popleft()
+            _schedule()
+            yield fut.result()[1]
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
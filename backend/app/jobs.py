@@ -0,0 +1,99 @@
+#jobs.py
+#small in-process job scheduler for background ComicVine syncs
+#jobs are keyed (ie. one key per month); submitting a key that already has a
+#queued/running job returns that job instead of starting another one
+#long-running maintenance (submit_background) gets its own worker, so it
+#never holds up the syncs queued behind it
+from __future__ import annotations
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from .config import SYNC_WORKERS
+
+log = logging.getLogger(__name__)
+
+#finished jobs kept around so clients can still poll their status
+MAX_FINISHED = 200
+
+class Job:
+    def __init__(self, key: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "pending"  # pending -> running -> done | failed
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+_executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="sync-job")
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background-job")
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, Job]" = OrderedDict()  # id -> job
+_active: Dict[str, Job] = {}  # key -> queued/running job
+
+def _run(job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    try:
+        job.result = fn(*args, **kwargs)
+        job.status = "done"
+    except Exception as e:
+        job.error = repr(e)
+        job.status = "failed"
+        log.exception("Job %s failed", job.key)
+    finally:
+        job.finished_at = datetime.utcnow()
+        with _lock:
+            _active.pop(job.key, None)
+            _prune()
+
+#drop the oldest finished jobs once we're over the limit
+def _prune() -> None:
+    finished = [jid for jid, j in _jobs.items() if j.finished]
+    for jid in finished[: max(0, len(finished) - MAX_FINISHED)]:
+        _jobs.pop(jid, None)
+
+def _submit(executor: ThreadPoolExecutor, key: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Job:
+    with _lock:
+        job = _active.get(key)
+        if job is not None:
+            return job
+        job = Job(key)
+        _jobs[job.id] = job
+        _active[key] = job
+    executor.submit(_run, job, fn, args, kwargs)
+    return job
+
+#single-flight submit: returns the already queued/running job for `key` if there is one
+def submit(key: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+    return _submit(_executor, key, fn, args, kwargs)
+
+#same, on the background worker instead of the sync workers
+def submit_background(key: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+    return _submit(_background, key, fn, args, kwargs)
+
+def get(job_id: str) -> Optional[Job]:
+    with _lock:
+        return _jobs.get(job_id)
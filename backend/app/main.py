@@ -1,20 +1,44 @@
 #main.py
 from __future__ import annotations
 
+import hashlib
+import time
+from contextlib import asynccontextmanager
 from datetime import date, datetime, timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlmodel import Session, select
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, computed_field, field_validator
+from sqlalchemy.orm import load_only
+from sqlmodel import Session, func, select
 
-from .db import engine
+from .db import engine, init_db, read
 from .models import Comic
-from .services import cv_sync_range_to_db 
+from . import (
+    coverage, covers, descriptions, export, jobs, metrics, paging, release_calendar, response_cache, search_index,
+    suggest, volume_cache, volume_index,
+)
+from .config import FAST_JSON, GZIP_MIN_BYTES, SYNC_MODE
+from .fastjson import Compress, FastJSONResponse
+from .services import cv_sync_range
+from .utils import week_window_from_wed
+
+#create tables + search index before serving requests
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    suggest.build()
+    #targeted syncs need the volume index; bootstrap/refresh it in the background
+    if SYNC_MODE == "targeted":
+        volume_index.schedule_refresh()
+    yield
 
 #created FastAPI instance
-app = FastAPI(title="Comic Finder API")
+app = FastAPI(title="Comic Finder API", lifespan=lifespan)
 
 #CORS for origins during local development
 app.add_middleware(
@@ -23,7 +47,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Sync-Status", "X-Sync-Job"],
 )
+#gzip large bodies (a 200-card page is ~60 KB of JSON, a few KB compressed)
+if GZIP_MIN_BYTES > 0:
+    app.add_middleware(Compress, minimum_size=GZIP_MIN_BYTES)
+
+#request latency per route template (ie. /api/comics/{comic_id}, not every id)
+@app.middleware("http")
+async def _time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.http_duration.observe(
+            time.perf_counter() - t0,
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status),
+        )
 
 
 #helper func
@@ -48,11 +94,40 @@ def _month_window(d: date) -> tuple[date, date]:
         next_first = first.replace(month=first.month + 1, day=1)
     last = next_first - timedelta(days=1)
     return first, last
+#title filter: FTS5 prefix match when available, otherwise LIKE scan
+#returns the statement plus the FTS expression (None when LIKE was used)
+def _title_filter(stmt, q: str):
+    expr = search_index.match_expression(q) if search_index.is_enabled() else None
+    if expr is None:
+        return stmt.where(Comic.title.ilike(f"%{q.strip()}%")), None
+    stmt = (
+        stmt.join(search_index.fts, search_index.fts.c.rowid == Comic.id)
+        .where(search_index.match_clause(expr))
+    )
+    return stmt, expr
+#the date range / title filters shared by /api/comics and /api/comics/export
+def _comic_filters(stmt, start: Optional[str], end: Optional[str], q: Optional[str]):
+    sd = ed = None
+    if start and end:
+        sd, ed = _d(start), _d(end)
+        stmt = stmt.where(Comic.onsale_date >= sd, Comic.onsale_date <= ed)
+    if q:
+        stmt, _ = _title_filter(stmt, q)
+    return stmt, sd, ed
+
+
+
+def _cover_url(comic_id: int, thumbnail_url: Optional[str]) -> Optional[str]:
+    if not thumbnail_url:
+        return None
+    v = hashlib.sha1(thumbnail_url.encode("utf-8")).hexdigest()[:10]
+    return f"/api/covers/{comic_id}?size={covers.DEFAULT_VARIANT}&v={v}"
 
 
 
 #Models
-class ComicOut(BaseModel):
+#what the grid needs for one card (list routes)
+class ComicCard(BaseModel):
     id: int
     marvel_id: Optional[int]
     title: str
@@ -60,77 +135,358 @@ class ComicOut(BaseModel):
     onsale_date: Optional[date] = None
     format: Optional[str] = None
     thumbnail_url: Optional[str] = None
-    description: Optional[str] = None
+
+    #locally cached cover; v changes with the source url so it can be cached forever
+    @computed_field
+    @property
+    def cover_url(self) -> Optional[str]:
+        return _cover_url(self.id, self.thumbnail_url)
 
     class Config:
         from_attributes = True
+#full record for the details modal
+#description is plain text; description_html is the original ComicVine HTML when there was any
+class ComicOut(ComicCard):
+    description: Optional[str] = None
+    description_html: Optional[str] = None
+
+    #stored zlib-compressed
+    @field_validator("description_html", mode="before")
+    @classmethod
+    def _unpack_html(cls, v):
+        return descriptions.unpack(v) if isinstance(v, bytes) else v
+#paged envelope, returned when a list route gets `page` or `cursor`
+class ComicPage(BaseModel):
+    items: List[ComicCard]
+    total: int
+    next_cursor: Optional[str] = None
+#one week of the batch route; sync_job is set when an empty week's month is being synced
+class WeekCards(BaseModel):
+    wed: date
+    items: List[ComicCard]
+    sync_job: Optional[str] = None
+#release counts for the calendar view
+class CalendarWeek(BaseModel):
+    wed: date
+    count: int
+class Calendar(BaseModel):
+    weeks: List[CalendarWeek]
+    total: int
+#one search-as-you-type entry: a series and its number of issues
+class SeriesSuggestion(BaseModel):
+    series: str
+    count: int
+#uncached route results: FAST_JSON dicts are already in response_model's
+#shape, so they're encoded directly instead of going through FastAPI's validation
+def _send(content):
+    return FastJSONResponse(content) if FAST_JSON else content
+#card columns, in ComicCard's field order
+_CARD_COLUMNS = [getattr(Comic, f) for f in ComicCard.model_fields]
+#rows -> cards; with FAST_JSON plain dicts with exactly ComicCard's JSON keys
+#(no per-row validation), otherwise ComicCard models
+def _out(rows) -> List[Any]:
+    if FAST_JSON:
+        return [_card(r) for r in rows]
+    return [ComicCard.model_validate(r) for r in rows]
+def _card(row) -> Dict[str, Any]:
+    d = row._asdict()
+    d["cover_url"] = _cover_url(d["id"], d["thumbnail_url"])
+    return d
+#SELECT for list routes: only the card columns, description etc. are never read
+#(FAST_JSON selects bare columns, so no ORM objects are built either)
+def _select_cards():
+    if FAST_JSON:
+        return select(*_CARD_COLUMNS)
+    return select(Comic).options(load_only(*_CARD_COLUMNS))
+#one page of a filtered (unordered) statement
+#with a cursor: keyset on (onsale_date, title, id); without: plain offset
+#with `ranked` (the FTS expression of a search) the order is bm25 first and
+#the cursor carries the score too
+#the total is counted once per catalog version and filter (count_key)
+#returns a ComicPage-shaped dict (items as _out makes them)
+def _page(s: Session, stmt, count_key, *, limit: int, cursor: Optional[str], skip: int = 0,
+          newest_first: bool = False, ranked: Optional[str] = None):
+    total = response_cache.cached_count(
+        s, count_key, lambda: s.exec(select(func.count()).select_from(stmt.subquery())).one()
+    )
+    if ranked is not None:
+        stmt = stmt.order_by(*paging.ranked_order_by(search_index.rank()))
+        if cursor:
+            stmt = stmt.where(paging.after_ranked(search_index.rank(), *paging.decode_ranked_cursor(cursor)))
+    else:
+        stmt = stmt.order_by(*paging.order_by(newest_first))
+        if cursor:
+            stmt = stmt.where(paging.after(paging.decode_cursor(cursor), newest_first))
+    if skip and not cursor:
+        stmt = stmt.offset(skip)
+    rows = s.exec(stmt.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if more and rows:
+        last = rows[-1]
+        score = search_index.score(s, ranked, last.id) if ranked is not None else None
+        next_cursor = paging.encode_cursor(last, score)
+    return {"items": _out(rows), "total": total, "next_cursor": next_cursor}
 
 
 #routes
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
+#Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-@app.get("/api/comics", response_model=List[ComicOut])
-def list_comics(
+#list routes return a plain list by default; passing `page` (1-based) or
+#`cursor` (next_cursor from the previous page) returns a ComicPage instead
+@app.get("/api/comics", response_model=Union[List[ComicCard], ComicPage])
+async def list_comics(
     start: Optional[str] = None,
     end: Optional[str] = None,
     q: Optional[str] = None,
     limit: int = Query(100, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    page: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
 ):
     #finds a paginated list of comic books with the ablility to filter by date and title
-    with Session(engine) as s:
-        stmt = select(Comic)
-        if start and end:
-            sd, ed = _d(start), _d(end)
-            stmt = stmt.where(Comic.onsale_date >= sd, Comic.onsale_date <= ed)
-        if q:
-            like = f"%{q}%"
-            stmt = stmt.where(Comic.title.ilike(like))
-        stmt = stmt.order_by(Comic.onsale_date, Comic.title).offset(offset).limit(limit)
-        rows = s.exec(stmt).all()
-        return rows
+    stmt, sd, ed = _comic_filters(_select_cards(), start, end, q)
+    if page is not None or cursor is not None:
+        skip = (page - 1) * limit if page else offset
+        key = ("count:comics", sd, ed, (q or "").strip().lower())
+        return _send(await read(lambda s: _page(s, stmt, key, limit=limit, cursor=cursor, skip=skip)))
+    stmt = stmt.order_by(Comic.onsale_date, Comic.title).offset(offset).limit(limit)
+    return _send(await read(lambda s: _out(s.exec(stmt).all())))
+#whole catalog (or the same date/title filters as /api/comics) as NDJSON or CSV
+#rows are streamed from a server-side cursor, nothing is built up in memory
+@app.get("/api/comics/export")
+def export_comics(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    q: Optional[str] = None,
+    format: str = Query("ndjson"),
+):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(export.FORMATS)}")
+    stmt, sd, ed = _comic_filters(export.base_query(), start, end, q)
+    name = "comics" + (f"-{sd}-{ed}" if sd else "") + f".{format}"
+    return StreamingResponse(
+        export.stream(stmt, format),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+#background sync for a whole month; concurrent requests for the same month share one job
+#returns None if the month was synced recently (the week really is empty)
+def _auto_sync_month(d: date) -> Optional[jobs.Job]:
+    mstart, mend = _month_window(d)
+    if coverage.is_fresh(mstart, mend):
+        return None
+    return jobs.submit(
+        f"cv-sync:{mstart.isoformat()}:{mend.isoformat()}",
+        lambda: cv_sync_range(mstart.isoformat(), mend.isoformat(), kind="auto").report(),
+    )
 #gets comics for each week
-#syncs to current month if data DNE
-@app.get("/api/comics/week", response_model=List[ComicOut])
-def comics_week(wed: str):
+#if the week is empty, starts a background sync of its month and answers
+#202 right away; the job can be polled at /api/jobs/{id}
+#responses are cached per week until the next sync changes the catalog
+#the whole week is returned unless `page`/`cursor` ask for a ComicPage
+@app.get("/api/comics/week", response_model=Union[List[ComicCard], ComicPage])
+async def comics_week(
+    request: Request,
+    wed: str,
+    limit: int = Query(100, ge=1, le=200),
+    page: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
     wed_d = _d(wed)
     start, end = _week_window(wed_d)
+    paged = page is not None or cursor is not None
 
-    def _query_week():
-        with Session(engine) as s:
-            stmt = (
-                select(Comic)
-                .where(Comic.onsale_date >= start, Comic.onsale_date <= end)
-                .order_by(Comic.onsale_date, Comic.title)
-            )
-            return s.exec(stmt).all()
-    rows = _query_week()
-    if rows:
-        return rows
-    mstart, mend = _month_window(wed_d)
+    def _query_week(s: Session):
+        stmt = _select_cards().where(Comic.onsale_date >= start, Comic.onsale_date <= end)
+        if paged:
+            return _page(s, stmt, ("count:week", start), limit=limit, cursor=cursor,
+                         skip=((page or 1) - 1) * limit)
+        stmt = stmt.order_by(Comic.onsale_date, Comic.title)
+        return _out(s.exec(stmt).all())
+
+    async def _build():
+        rows = await read(_query_week)
+        if (rows["total"] if paged else rows) or cursor:
+            return rows
+        job = await run_in_threadpool(_auto_sync_month, wed_d)
+        if job is None:
+            return rows
+        return _sync_pending(job, rows)
+    key = ("week", start, page, cursor, limit) if paged else ("week", start)
+    return await response_cache.cached_json(request, key, _build)
+#several weeks' cards in one round trip (ie. prefetching the weeks around the
+#current one); each wed is snapped to its Wednesday like utils.week_window_from_wed
+#empty weeks start at most one background sync per month
+MAX_BATCH_WEEKS = 12
+@app.get("/api/comics/weeks", response_model=List[WeekCards])
+async def comics_weeks(request: Request, wed: List[str] = Query(...)):
     try:
-        cv_sync_range_to_db(mstart.isoformat(), mend.isoformat())
-    except Exception as e:
-        print("Auto-sync failed:", repr(e))
-    return _query_week()
+        windows = sorted({week_window_from_wed(w) for w in wed})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(windows) > MAX_BATCH_WEEKS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_WEEKS} weeks per request")
+
+    #one range read per week, each already in index order (an OR of the
+    #ranges in a single query would have to be sorted)
+    def _query(s: Session):
+        return {
+            a: _out(s.exec(
+                _select_cards().where(Comic.onsale_date >= a, Comic.onsale_date <= b)
+                .order_by(Comic.onsale_date, Comic.title)
+            ).all())
+            for a, b in windows
+        }
+
+    async def _build():
+        by_week = await read(_query)
+        #WeekCards-shaped dicts
+        out = [{"wed": a, "items": by_week[a], "sync_job": None} for a, _ in windows]
+        month_jobs = {}
+        for week in out:
+            if week["items"]:
+                continue
+            month = week["wed"].replace(day=1)
+            if month not in month_jobs:
+                month_jobs[month] = await run_in_threadpool(_auto_sync_month, week["wed"])
+            if month_jobs[month] is not None:
+                week["sync_job"] = month_jobs[month].id
+        if any(w["sync_job"] for w in out):
+            #not cached: these weeks fill in once their jobs finish
+            return FastJSONResponse(out)
+        return out
+    return await response_cache.cached_json(request, ("weeks", tuple(a for a, _ in windows)), _build)
+#202 reply for a week whose month is being synced in the background
+def _sync_pending(job: jobs.Job, empty) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(empty),
+        headers={
+            "X-Sync-Status": job.status,
+            "X-Sync-Job": job.id,
+            "Location": f"/api/jobs/{job.id}",
+        },
+    )
+#comics per release week (Wednesday to Tuesday) between start and end, for a
+#month/year view; read from the release_week summary, never starts a sync
+MAX_CALENDAR_WEEKS = 530
+@app.get("/api/calendar", response_model=Calendar)
+async def release_counts(request: Request, start: str, end: str):
+    sd, ed = _d(start), _d(end)
+    if ed < sd:
+        raise HTTPException(status_code=422, detail="end must not be before start")
+    weds = release_calendar.wednesdays(sd, ed)
+    if len(weds) > MAX_CALENDAR_WEEKS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_CALENDAR_WEEKS} weeks per request")
+
+    async def _build():
+        got = await read(lambda s: release_calendar.counts(s, weds[0], weds[-1]))
+        weeks = [CalendarWeek(wed=w, count=got.get(w, 0)) for w in weds]
+        return Calendar(weeks=weeks, total=sum(w.count for w in weeks))
+    return await response_cache.cached_json(request, ("calendar", weds[0], weds[-1]), _build)
+#status of a background sync job
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 #used during testing to sync data
+#full=true re-crawls the range instead of asking only for changed issues
+#mode=targeted|full overrides SYNC_MODE for this run
 @app.post("/api/cv/sync")
-def cv_sync(start: str, end: str):
+def cv_sync(start: str, end: str, full: bool = False, mode: Optional[str] = Query(None, pattern="^(full|targeted)$")):
     sd, ed = _d(start), _d(end)
-    inserted, updated = cv_sync_range_to_db(sd.isoformat(), ed.isoformat())
-    return {"inserted": inserted, "updated": updated}
-#search comics from newest to oldest
-@app.get("/api/comics/search", response_model=List[ComicOut])
-def search(q: str, limit: int = Query(50, ge=1, le=100), offset: int = Query(0, ge=0)):
+    run = cv_sync_range(sd.isoformat(), ed.isoformat(), full=full, mode=mode)
+    return run.report()
+#drop cached volume->publisher entries (all of them if no ids are given)
+#so the next sync looks them up on ComicVine again
+@app.post("/api/cv/volumes/invalidate")
+def cv_volumes_invalidate(ids: Optional[List[int]] = Query(None)):
+    return {"invalidated": volume_cache.invalidate(ids)}
+#pull ComicVine's volume changes into the publisher index used by targeted syncs
+@app.post("/api/cv/volumes/refresh")
+def cv_volumes_refresh(force: bool = True):
+    return volume_index.refresh(force=force)
+#search comics, best match first (bm25), ties newest to oldest; paged results
+#keep that order (their cursors carry the score). without FTS5 (LIKE
+#fallback) there's no score and results are newest to oldest
+@app.get("/api/comics/search", response_model=Union[List[ComicCard], ComicPage])
+async def search(
+    request: Request,
+    q: str,
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    page: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
+    norm = q.strip().lower()
+    paged = page is not None or cursor is not None
+
+    def _query(s: Session):
+        stmt, expr = _title_filter(_select_cards(), q)
+        if paged:
+            skip = (page - 1) * limit if page else offset
+            return _page(s, stmt, ("count:search", norm), limit=limit, cursor=cursor,
+                         skip=skip, newest_first=True, ranked=expr)
+        #same order as the ranked pages, so page 1 matches the plain list
+        order = [Comic.onsale_date.desc(), Comic.title]
+        if expr is not None:
+            order = paging.ranked_order_by(search_index.rank())
+        stmt = stmt.order_by(*order).offset(offset).limit(limit)
+        return _out(s.exec(stmt).all())
+
+    async def _build():
+        return await read(_query)
+    return await response_cache.cached_json(request, ("search", norm, limit, offset, page, cursor), _build)
+#series names for the search box as the user types, most issues first
+#answered from the in-memory prefix index (suggest.py); the stored catalog
+#version is re-read at most every suggest.VERSION_CHECK_EVERY seconds, off the event loop
+@app.get("/api/comics/suggest", response_model=List[SeriesSuggestion])
+async def suggest_series(q: str, limit: int = Query(10, ge=1, le=suggest.MAX_K)):
+    if suggest.stale():
+        await run_in_threadpool(suggest.catch_up)
+    return [SeriesSuggestion(series=series, count=n) for series, n in suggest.complete(q, limit)]
+#cover image from the local cache (downloaded on first use if the sync didn't)
+#size is one of covers.VARIANTS
+@app.get("/api/covers/{comic_id}")
+def cover(comic_id: int, size: str = Query(covers.DEFAULT_VARIANT)):
+    if size not in covers.VARIANTS:
+        raise HTTPException(status_code=422, detail=f"size must be one of {', '.join(covers.VARIANTS)}")
     with Session(engine) as s:
-        like = f"%{q.strip()}%"
-        stmt = (
-            select(Comic)
-            .where(Comic.title.ilike(like))
-            .order_by(Comic.onsale_date.desc(), Comic.title)
-            .offset(offset)
-            .limit(limit)
-        )
-        return s.exec(stmt).all()
+        url = s.exec(select(Comic.thumbnail_url).where(Comic.id == comic_id)).first()
+    if not url:
+        raise HTTPException(status_code=404, detail="No cover for this comic")
+    try:
+        path, blob = covers.get_cover(url, size)
+    except covers.CoverError as e:
+        raise HTTPException(status_code=502, detail=f"Cover download failed: {e}")
+    return FileResponse(
+        path,
+        media_type=blob.content_type,
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{blob.digest}"',
+        },
+    )
+#one comic with its description (details modal)
+#declared last so /api/comics/search, /week etc. aren't read as an id
+@app.get("/api/comics/{comic_id}", response_model=ComicOut)
+async def get_comic(request: Request, comic_id: int):
+    def _query(s: Session):
+        comic = s.get(Comic, comic_id)
+        if comic is None:
+            raise HTTPException(status_code=404, detail="Comic not found")
+        return ComicOut.model_validate(comic)
+
+    async def _build():
+        return await read(_query)
+    return await response_cache.cached_json(request, ("comic", comic_id), _build)
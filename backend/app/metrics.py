@@ -0,0 +1,145 @@
+#metrics.py
+#tiny Prometheus-style metrics registry (text exposition format, no extra deps)
+#collects route latency, SQL statement timings (via engine events), ComicVine
+#calls and sync runs; served by GET /metrics
+from __future__ import annotations
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import SLOW_QUERY_MS
+
+log = logging.getLogger("comic_finder.sql")
+
+PREFIX = "comicfinder_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name, self.help, self.labels = PREFIX + name, help, tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = tuple(str(l) for l in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(v)}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name, self.help, self.labels = PREFIX + name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        #labels -> [bucket counts..., sum, count]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = tuple(str(l) for l in labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, row in items:
+            for i, b in enumerate(self.buckets):
+                le = f'le="{_fmt_num(b)}"'
+                yield f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {_fmt_num(row[i])}"
+            yield f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_num(row[-2])}"
+            yield f"{self.name}_count{_fmt_labels(self.labels, key)} {_fmt_num(row[-1])}"
+
+#--- the metrics ----------------------------------------------------------------
+http_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status"),
+)
+sql_duration = Histogram(
+    "sql_statement_duration_seconds", "SQL statement execution time", ("operation",), SQL_BUCKETS,
+)
+sql_slow = Counter("sql_slow_statements_total", "Statements slower than SLOW_QUERY_MS", ("operation",))
+cv_requests = Counter(
+    "comicvine_requests_total", "ComicVine API calls by resource and outcome", ("resource", "status"),
+)
+cv_duration = Histogram("comicvine_request_duration_seconds", "ComicVine API call latency", ("resource",))
+sync_duration = Histogram(
+    "sync_duration_seconds", "Duration of ComicVine sync runs", ("kind",),
+    (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+sync_rows = Counter("sync_rows_written_total", "Comic rows written by syncs", ("op",))
+
+REGISTRY = [http_duration, sql_duration, sql_slow, cv_requests, cv_duration, sync_duration, sync_rows]
+
+def render() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+#--- SQL instrumentation --------------------------------------------------------
+def _operation(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+#times every statement on `engine`; statements slower than SLOW_QUERY_MS
+#(if set) are logged to the comic_finder.sql logger
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        op = _operation(statement)
+        sql_duration.observe(elapsed, op)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            sql_slow.inc(op)
+            log.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts:
+            starts.pop()
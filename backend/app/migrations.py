@@ -0,0 +1,98 @@
+#migrations.py
+#versioned schema changes, run in order by db.init_db at startup
+#create_all still creates the tables a database doesn't have yet (a new
+#database gets the current schema straight from the models); everything that
+#changes an existing database is a numbered step here. schema_migration
+#records which steps a database has had, so each runs once
+#
+#steps must be safe to re-run (a crash between a step and its record, or a
+#second worker starting at the same time, runs it again). a step that returns
+#False couldn't apply to this database (ie. SQLite built without FTS5, or not
+#SQLite at all) and isn't recorded, so it's tried again on the next start
+from __future__ import annotations
+import logging
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, LargeBinary, String, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeEngine
+from sqlmodel import Session, select
+
+from . import descriptions, release_calendar, search_index, suggest
+from .db import upsert_insert
+from .models import Comic, SchemaMigration
+
+log = logging.getLogger(__name__)
+
+#columns added to existing tables after the first release, with their types
+#as of when each was added; create_all never alters a table that exists
+#(a new column needs a new step below, never an entry here)
+ADDED_COLUMNS: List[Tuple[str, str, TypeEngine]] = [
+    ("comic", "content_hash", String()),
+    ("volume", "cv_updated", DateTime()),
+    ("comic", "description_html", LargeBinary()),
+]
+
+def _add_missing_columns(e: Engine) -> None:
+    insp = inspect(e)
+    with e.begin() as conn:
+        for table, column, type_ in ADDED_COLUMNS:
+            if not insp.has_table(table):
+                continue
+            if column in {c["name"] for c in insp.get_columns(table)}:
+                continue
+            ddl = type_.compile(dialect=e.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl}')
+        if insp.has_table("volume"):
+            conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_volume_cv_updated ON volume (cv_updated)")
+
+#rows synced before descriptions were split (see descriptions.py); no VACUUM
+#here, `python -m app.descriptions migrate` does that when the space matters
+def _split_descriptions(e: Engine) -> None:
+    stats = descriptions.migrate(e, vacuum=False)
+    if stats["converted"]:
+        log.info("split %d stored HTML descriptions", stats["converted"])
+
+#ix_comic_list (see models.Comic) replaces the single-column date index
+def _list_indexes(e: Engine) -> None:
+    with e.begin() as conn:
+        for index in Comic.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_comic_onsale_date")
+
+#(version, name, step); append only, never renumber
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], Optional[bool]]]] = [
+    (1, "columns added after the first release", _add_missing_columns),
+    (2, "comic_fts search index", search_index.ensure_search_index),
+    (3, "release_week counts", release_calendar.ensure_release_calendar),
+    (4, "series_count counts", suggest.ensure_series_counts),
+    (5, "plain-text descriptions", _split_descriptions),
+    (6, "covering index for the list routes", _list_indexes),
+]
+
+def _record(e: Engine, version: int, name: str) -> None:
+    insert = upsert_insert(e)
+    stmt = insert(SchemaMigration.__table__).values(
+        version=version, name=name, applied_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=["version"])
+    with e.begin() as conn:
+        conn.execute(stmt)
+
+#applies the steps this database hasn't had; returns their versions
+def run(e: Engine) -> List[int]:
+    with Session(e) as s:
+        done = set(s.exec(select(SchemaMigration.version)).all())
+    applied: List[int] = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        t0 = time.perf_counter()
+        if step(e) is False:
+            log.info("migration %d (%s) doesn't apply here, will retry on the next start", version, name)
+            continue
+        _record(e, version, name)
+        applied.append(version)
+        log.info("applied migration %d (%s) in %.2fs", version, name, time.perf_counter() - t0)
+    return applied
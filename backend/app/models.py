@@ -1,17 +1,109 @@
 #models.py
 from __future__ import annotations
-from datetime import date
+from datetime import date, datetime
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 #pulling database models for comics
 class Comic(SQLModel, table=True):
+    #covering index for the list routes: date-window filters and the
+    #(onsale_date, title, id) ordering/keyset paging are answered from the index
+    #alone, in order, without a sort or a table lookup (id is listed so SQLite
+    #knows the index is ordered by it too). replaces the old ix_comic_onsale_date
+    __table_args__ = (
+        Index("ix_comic_list", "onsale_date", "title", "id", "marvel_id", "author", "format", "thumbnail_url"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     marvel_id: Optional[int] = Field(index=True, unique=True, default=None)
 
     title: str
     author: Optional[str] = None
-    onsale_date: Optional[date] = Field(default=None, index=True)
+    onsale_date: Optional[date] = None  # indexed by ix_comic_list
     format: Optional[str] = None
     thumbnail_url: Optional[str] = None
-    description: Optional[str] = None
+    description: Optional[str] = None  # plain-text summary, see descriptions.py
+    description_html: Optional[bytes] = None  # original HTML, zlib-compressed (details route only)
     issue_number: Optional[str] = None
+    #hash of the synced fields; lets the bulk upsert skip rows that didn't change
+    content_hash: Optional[str] = None
+#ComicVine volumes we've looked up (mainly to know who publishes them)
+class Volume(SQLModel, table=True):
+    id: int = Field(primary_key=True)  # ComicVine volume id
+    name: Optional[str] = None
+    publisher: Optional[str] = None
+    fetched_at: datetime
+    #ComicVine's date_last_updated, known once the volume index refresh has seen it
+    cv_updated: Optional[datetime] = Field(default=None, index=True)
+#one row per completed sync pass: which range/date field was crawled and when
+class SyncCoverage(SQLModel, table=True):
+    __tablename__ = "sync_coverage"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    start_date: date
+    end_date: date
+    date_field: str
+    synced_at: datetime = Field(index=True)  # when the pass started
+#issues per series name (the part of a title before " #"), for /api/comics/suggest
+#kept up to date by triggers on comic, see suggest.py
+class SeriesCount(SQLModel, table=True):
+    __tablename__ = "series_count"
+    series: str = Field(primary_key=True)
+    count: int = 0
+    updated_at: Optional[float] = Field(default=None, index=True)  # julianday of the last change
+#one row per refresh of the publisher volume index (volume_index.py);
+#since is where that refresh started reading ComicVine's change feed
+class VolumeRefresh(SQLModel, table=True):
+    __tablename__ = "volume_refresh"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    since: datetime
+    refreshed_at: datetime = Field(index=True)  # when the refresh started
+    volumes: int = 0
+#the volume index refresh in progress (a single row, id 1): the process
+#holding it (claimed_by, with claimed_at renewed every page; an older claim
+#has been abandoned) and how far it got, so a refresh stopped by its call
+#cap or a crash picks up at next_offset instead of starting over
+class VolumeRefreshState(SQLModel, table=True):
+    __tablename__ = "volume_refresh_state"
+    id: int = Field(default=1, primary_key=True)
+    claimed_by: Optional[str] = None
+    claimed_at: Optional[datetime] = None
+    since: Optional[datetime] = None  # None: no unfinished refresh
+    started_at: Optional[datetime] = None  # becomes VolumeRefresh.refreshed_at
+    next_offset: int = 0
+    volumes: int = 0
+    updated_at: Optional[datetime] = None  # last checkpoint
+#progress of an unfinished sync pass: the /issues/ offset after the last
+#committed page, so an interrupted pass picks up there instead of at offset 0
+class SyncCheckpoint(SQLModel, table=True):
+    __tablename__ = "sync_checkpoint"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    start_date: date
+    end_date: date
+    date_field: str
+    updated_since: Optional[datetime] = None  # the incremental cutoff the pass was using
+    next_offset: int = 0
+    updated_at: datetime
+#number of comics per release week (keyed by the week's Wednesday)
+#kept up to date by triggers on comic, see release_calendar.py
+class ReleaseWeek(SQLModel, table=True):
+    __tablename__ = "release_week"
+    week_start: date = Field(primary_key=True)
+    count: int = 0
+#cached cover image variants (see covers.py); key is "<variant>|<source url>"
+class CoverBlob(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    digest: str = Field(index=True)  # sha256 of the file in the cover cache
+    size: int
+    content_type: str
+    accessed_at: datetime = Field(index=True)
+#schema migrations a database has had (migrations.py)
+class SchemaMigration(SQLModel, table=True):
+    __tablename__ = "schema_migration"
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime
+#catalog version: bumped in the same transaction as any write that changes
+#what the read routes return, so every worker/process sees it (response_cache.py)
+class CatalogVersion(SQLModel, table=True):
+    __tablename__ = "catalog_version"
+    id: int = Field(default=1, primary_key=True)  # single row
+    version: int = 0
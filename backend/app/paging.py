@@ -0,0 +1,84 @@
+#paging.py
+#keyset ("seek") pagination for the comic list routes
+#rows are ordered by (onsale_date, title, id) and a cursor is the sort key of
+#the last row on a page, so the next page starts right after it instead of
+#making the database skip OFFSET rows again
+#ranked search pages sort by the bm25 score first; their cursors carry the
+#last row's score in front of the date key
+from __future__ import annotations
+import base64
+import json
+from datetime import date
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+from .db import engine
+from .models import Comic
+
+Cursor = Tuple[Optional[date], str, int]
+
+def encode_cursor(row: Any, score: Optional[float] = None) -> str:
+    d = row.onsale_date.isoformat() if row.onsale_date else None
+    key = [d, row.title, row.id] if score is None else [score, d, row.title, row.id]
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode(cursor: str, size: int) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        key = None
+    if not isinstance(key, list) or len(key) != size:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    return key
+
+def _date_key(d: Any, title: Any, cid: Any) -> Cursor:
+    try:
+        return (date.fromisoformat(d) if d else None), str(title), int(cid)
+    except Exception:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+def decode_cursor(cursor: str) -> Cursor:
+    return _date_key(*_decode(cursor, 3))
+
+#(score, date key) of a ranked search cursor
+def decode_ranked_cursor(cursor: str) -> Tuple[float, Cursor]:
+    score, *rest = _decode(cursor, 4)
+    if not isinstance(score, (int, float)):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    return float(score), _date_key(*rest)
+
+#ORDER BY for keyset pages; newest_first sorts the date descending (search)
+#NULL dates come first ascending / last descending, like SQLite does by default
+def order_by(newest_first: bool = False) -> List[Any]:
+    d = Comic.onsale_date.desc() if newest_first else Comic.onsale_date.asc()
+    if engine.dialect.name == "postgresql":
+        d = d.nulls_last() if newest_first else d.nulls_first()
+    return [d, Comic.title, Comic.id]
+
+#ORDER BY for ranked search pages: best score first, ties newest first
+def ranked_order_by(score: Any) -> List[Any]:
+    return [score, *order_by(newest_first=True)]
+
+#WHERE clause selecting the rows that sort after a ranked cursor
+#(score is the same expression the query orders by)
+def after_ranked(score: Any, last_score: float, cursor: Cursor):
+    return or_(score > last_score, and_(score == last_score, after(cursor, newest_first=True)))
+
+#WHERE clause selecting the rows that sort after `cursor`
+def after(cursor: Cursor, newest_first: bool = False):
+    d, title, cid = cursor
+    rest = or_(Comic.title > title, and_(Comic.title == title, Comic.id > cid))
+    if not newest_first:
+        if d is None:
+            return or_(and_(Comic.onsale_date.is_(None), rest), Comic.onsale_date.isnot(None))
+        return tuple_(Comic.onsale_date, Comic.title, Comic.id) > tuple_(d, title, cid)
+    if d is None:
+        return and_(Comic.onsale_date.is_(None), rest)
+    return or_(
+        Comic.onsale_date < d,
+        and_(Comic.onsale_date == d, rest),
+        Comic.onsale_date.is_(None),
+    )
@@ -0,0 +1,91 @@
+#ratelimit.py
+#token bucket per ComicVine resource, kept in a small SQLite file so every
+#uvicorn worker (and a manual sync overlapping an auto-sync) draws from the
+#same hourly budget. BEGIN IMMEDIATE makes take-a-token atomic across processes
+from __future__ import annotations
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .config import CV_RATE_BURST, CV_RATE_DB, CV_RATE_PER_HOUR
+
+log = logging.getLogger(__name__)
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS cv_rate_bucket (
+    resource TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+def enabled() -> bool:
+    return CV_RATE_PER_HOUR > 0
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(CV_RATE_DB, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_DDL)
+        _conn = conn
+    return _conn
+
+#tries to take one token; returns 0 on success, else seconds until one is available
+def _try_take(resource: str, now: float) -> float:
+    rate = CV_RATE_PER_HOUR / 3600.0
+    capacity = max(1.0, CV_RATE_BURST)
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM cv_rate_bucket WHERE resource = ?", (resource,)
+        ).fetchone()
+        tokens, updated = row if row else (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1.0:
+            tokens -= 1.0
+        else:
+            wait = (1.0 - tokens) / rate
+        conn.execute(
+            "INSERT INTO cv_rate_bucket(resource, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(resource) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (resource, tokens, now),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return wait
+
+#blocks until a request to `resource` fits in the shared budget
+def acquire(resource: str) -> None:
+    if not enabled():
+        return
+    while True:
+        with _lock:
+            wait = _try_take(resource, time.time())
+        if wait <= 0:
+            return
+        if wait > 5:
+            log.info("ComicVine %s budget used up, waiting %.0fs", resource, wait)
+        time.sleep(wait)
+
+#ComicVine says we're over the limit: empty the bucket so every process backs off,
+#not just the one that got the 420
+def drain(resource: str) -> None:
+    if not enabled():
+        return
+    with _lock:
+        conn = _db()
+        conn.execute(
+            "INSERT INTO cv_rate_bucket(resource, tokens, updated_at) VALUES (?, 0, ?) "
+            "ON CONFLICT(resource) DO UPDATE SET tokens = 0, updated_at = excluded.updated_at",
+            (resource, time.time()),
+        )
@@ -0,0 +1,118 @@
+#release_calendar.py
+#per-week release counts for the calendar view (release_week table)
+#triggers on comic add/subtract one whenever a row is inserted, deleted or
+#moves to another date, so every write (sync, snapshot import, seed) keeps the
+#counts current without rescanning the catalog. weeks start on Wednesday, the
+#same windows as utils.week_window_from_wed
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Dict, List
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, func, select
+
+from .db import has_sqlite_object
+from .models import Comic, ReleaseWeek
+from .utils import week_window_from_wed
+
+#SQL for "the Wednesday on or before d" (strftime %w: Sunday = 0, Wednesday = 3)
+def _wed(d: str) -> str:
+    return f"date({d}, printf('-%d days', (CAST(strftime('%w', {d}) AS INTEGER) + 4) % 7))"
+
+def _add(d: str, n: int) -> str:
+    return (
+        f"INSERT INTO release_week(week_start, count) VALUES ({_wed(d)}, {n}) "
+        f"ON CONFLICT(week_start) DO UPDATE SET count = count + ({n});"
+    )
+
+_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS release_week_ai AFTER INSERT ON comic
+    WHEN new.onsale_date IS NOT NULL BEGIN
+        {_add("new.onsale_date", 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS release_week_ad AFTER DELETE ON comic
+    WHEN old.onsale_date IS NOT NULL BEGIN
+        {_add("old.onsale_date", -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS release_week_au AFTER UPDATE OF onsale_date ON comic
+    WHEN old.onsale_date IS NOT new.onsale_date BEGIN
+        INSERT INTO release_week(week_start, count)
+        SELECT {_wed("old.onsale_date")}, -1 WHERE old.onsale_date IS NOT NULL
+        ON CONFLICT(week_start) DO UPDATE SET count = count - 1;
+        INSERT INTO release_week(week_start, count)
+        SELECT {_wed("new.onsale_date")}, 1 WHERE new.onsale_date IS NOT NULL
+        ON CONFLICT(week_start) DO UPDATE SET count = count + 1;
+    END
+    """,
+]
+
+#set by detect at startup; False on non-SQLite urls (counts are computed per request there)
+_enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+#creates the triggers if needed (safe to call repeatedly); the first time,
+#release_week is filled from the existing comic rows
+def ensure_release_calendar(engine: Engine) -> bool:
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conn:
+        existed = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='release_week_ai'"
+        ).first()
+        if not existed:
+            conn.exec_driver_sql("DELETE FROM release_week")
+            conn.exec_driver_sql(
+                f"INSERT INTO release_week(week_start, count) "
+                f"SELECT {_wed('onsale_date')}, count(*) FROM comic "
+                f"WHERE onsale_date IS NOT NULL GROUP BY 1"
+            )
+        for ddl in _DDL:
+            conn.exec_driver_sql(ddl)
+    return True
+
+#at startup, after the migrations: use release_week if its triggers exist
+def detect(engine: Engine) -> bool:
+    global _enabled
+    _enabled = has_sqlite_object(engine, "trigger", "release_week_ai")
+    return _enabled
+
+#Wednesday starting the release week that contains d
+def week_of(d: date) -> date:
+    return week_window_from_wed(d.isoformat())[0]
+
+#every Wednesday from the week containing `start` through the one containing `end`
+def wednesdays(start: date, end: date) -> List[date]:
+    w, last = week_of(start), week_of(end)
+    out: List[date] = []
+    while w <= last:
+        out.append(w)
+        w += timedelta(days=7)
+    return out
+
+#{wednesday: number of comics} for the weeks in [first_wed, last_wed]; weeks without comics are left out
+def counts(s: Session, first_wed: date, last_wed: date) -> Dict[date, int]:
+    if _enabled:
+        rows = s.exec(
+            select(ReleaseWeek.week_start, ReleaseWeek.count).where(
+                ReleaseWeek.week_start >= first_wed,
+                ReleaseWeek.week_start <= last_wed,
+                ReleaseWeek.count > 0,
+            )
+        ).all()
+        return dict(rows)
+    out: Dict[date, int] = {}
+    rows = s.exec(
+        select(Comic.onsale_date, func.count())
+        .where(Comic.onsale_date >= first_wed, Comic.onsale_date <= last_wed + timedelta(days=6))
+        .group_by(Comic.onsale_date)
+    ).all()
+    for d, n in rows:
+        out[week_of(d)] = out.get(week_of(d), 0) + n
+    return out
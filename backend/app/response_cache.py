@@ -0,0 +1,152 @@
+#response_cache.py
+#in-process cache of serialized JSON responses for the read routes
+#entries are tied to the catalog version (the catalog_version row), which
+#every writer bumps in the same transaction as its rows: syncs, snapshot
+#imports, the descriptions migration. each request reads the row (a primary
+#key lookup) before serving a cached entry or a 304, so a write from any
+#worker or CLI process makes every cached response stale at once
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import RESPONSE_CACHE_MAX_BYTES, RESPONSE_MAX_AGE
+from .db import engine, read, upsert_insert
+from .fastjson import dumps, gzipped, weak_etag
+from .models import CatalogVersion
+
+class Entry(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+
+_lock = threading.Lock()
+_version = 0
+_entries: "OrderedDict[Hashable, Entry]" = OrderedDict()
+_size = 0
+#row counts for paged responses: key -> (version, count)
+MAX_COUNTS = 1024
+_counts: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+_table = CatalogVersion.__table__
+
+#a Session's connection (in its transaction), or the Connection itself
+def _connection(conn):
+    return conn.connection() if isinstance(conn, Session) else conn
+
+#the stored version, through any session/connection (0 before the first bump)
+def load_version(conn) -> int:
+    return _connection(conn).execute(select(_table.c.version).where(_table.c.id == 1)).scalar() or 0
+
+#the catalog changed: bump the stored version inside the writer's transaction
+#(conn is its Session or Connection; None commits the bump on its own)
+def bump(conn=None) -> None:
+    if conn is None:
+        with engine.begin() as own:
+            bump(own)
+        return
+    conn = _connection(conn)
+    insert = upsert_insert(conn)
+    stmt = insert(_table).values(id=1, version=1)
+    conn.execute(stmt.on_conflict_do_update(index_elements=[_table.c.id], set_={"version": _table.c.version + 1}))
+
+#adopts the stored version; anything cached under another one is dropped
+def observe(version: int) -> int:
+    global _version, _size
+    with _lock:
+        if version != _version:
+            _version = version
+            _entries.clear()
+            _counts.clear()
+            _size = 0
+    return version
+
+def catalog_version() -> int:
+    return _version
+
+#reads the stored version (without blocking the event loop) and adopts it
+async def current_version() -> int:
+    return observe(await read(load_version))
+
+def _get(key: Hashable, version: int) -> Optional[Entry]:
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry.version != version:
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+def _put(key: Hashable, entry: Entry) -> None:
+    global _size
+    if len(entry.body) > RESPONSE_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        if entry.version != _version:
+            return
+        old = _entries.pop(key, None)
+        if old is not None:
+            _size -= len(old.body)
+        _entries[key] = entry
+        _size += len(entry.body)
+        while _size > RESPONSE_CACHE_MAX_BYTES and _entries:
+            _, evicted = _entries.popitem(last=False)
+            _size -= len(evicted.body)
+
+#total rows for a filter, counted once per catalog version
+#s is the request's session; the stored version is checked through it
+def cached_count(s, key: Hashable, count: Callable[[], int]) -> int:
+    version = observe(load_version(s))
+    with _lock:
+        hit = _counts.get(key)
+        if hit is not None and hit[0] == version:
+            _counts.move_to_end(key)
+            return hit[1]
+    n = count()
+    with _lock:
+        if version == _version:
+            _counts[key] = (version, n)
+            _counts.move_to_end(key)
+            while len(_counts) > MAX_COUNTS:
+                _counts.popitem(last=False)
+    return n
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+#If-None-Match uses the weak comparison: W/"x" matches "x"
+def _matches(request: Request, etag: str) -> bool:
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    tags = [_opaque(t.strip()) for t in inm.split(",")]
+    return "*" in tags or _opaque(etag) in tags
+
+def _headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={RESPONSE_MAX_AGE}, must-revalidate"}
+
+async def cached_json(request: Request, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Serve `key` from the cache (304 if the client's If-None-Match still matches,
+    without calling build at all); otherwise await build(), cache and send it.
+    If build() returns a Response it's sent as-is and not cached.
+    """
+    version = await current_version()
+    entry = _get(key, version)
+    if entry is None:
+        content = await build()
+        if isinstance(content, Response):
+            return content
+        body = dumps(content)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = Entry(version, etag, body)
+        _put(key, entry)
+    #the body goes out gzipped (see fastjson.Compress): the 304 says so too
+    etag = weak_etag(entry.etag) if gzipped(request, len(entry.body)) else entry.etag
+    if _matches(request, etag):
+        return Response(status_code=304, headers=_headers(etag))
+    return Response(content=entry.body, media_type="application/json", headers=_headers(etag))
@@ -0,0 +1,108 @@
+#search_index.py
+#full text search over comic titles and descriptions using SQLite FTS5
+#comic_fts is an external content table (it reads text from the comic table)
+#and triggers on comic keep it up to date on every insert/update/delete,
+#so anything that writes Comic rows (including the ComicVine sync) updates it
+from __future__ import annotations
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import func, literal_column, table, column
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select
+
+from .db import has_sqlite_object
+
+log = logging.getLogger(__name__)
+
+FTS_TABLE = "comic_fts"
+#title matches count 10x more than description matches in bm25 ranking
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='comic', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS comic_fts_ai AFTER INSERT ON comic BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS comic_fts_ad AFTER DELETE ON comic BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS comic_fts_au AFTER UPDATE OF title, description ON comic BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+#set by detect at startup; stays False on non-SQLite urls or builds without FTS5
+_enabled = False
+
+#lightweight table handle so queries can join against comic_fts
+fts = table(FTS_TABLE, column("rowid"))
+
+def is_enabled() -> bool:
+    return _enabled
+
+#creates the FTS table + triggers if needed (safe to call repeatedly)
+#a freshly created index is backfilled from the existing comic rows
+def ensure_search_index(engine: Engine) -> bool:
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            existed = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+            ).first()
+            for ddl in _DDL:
+                conn.exec_driver_sql(ddl)
+            if not existed:
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except OperationalError as e:
+        #sqlite compiled without FTS5 -> keep using LIKE
+        log.warning("FTS5 unavailable, falling back to LIKE search: %r", e)
+        return False
+    return True
+
+#at startup, after the migrations: FTS is used if comic_fts could be created
+def detect(engine: Engine) -> bool:
+    global _enabled
+    _enabled = has_sqlite_object(engine, "table", FTS_TABLE)
+    return _enabled
+
+#turns user text into an FTS5 query: every word must match, as a prefix
+#(ie. "spider ma" -> "spider"* "ma"*). returns None if there are no words to match
+def match_expression(q: Optional[str]) -> Optional[str]:
+    words = re.findall(r"\w+", (q or "").lower())
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+#WHERE clause for "comic_fts MATCH :expr"
+def match_clause(expr: str):
+    return literal_column(FTS_TABLE).op("MATCH")(expr)
+
+#bm25 score (lower is better) for ORDER BY
+def rank():
+    return func.bm25(literal_column(FTS_TABLE), TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+
+#rank() of one matching comic (the last row of a ranked page, for its cursor)
+def score(s, expr: str, comic_id: int) -> float:
+    return s.exec(select(rank()).select_from(fts).where(match_clause(expr), fts.c.rowid == comic_id)).one()
@@ -1,12 +1,20 @@
 #services.py
 from __future__ import annotations
-from typing import Any, Dict, List, Optional, Tuple
-from datetime import date
+import hashlib
+import json
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import date, datetime
 
 from sqlmodel import Session, select
-from .db import engine
+
+from . import coverage, covers, descriptions, metrics, response_cache, suggest, volume_index
+from .config import COVER_PREFETCH, CV_PUBLISHER, SYNC_MODE, SYNC_SNAPSHOT_DIR
+from .db import engine, upsert_insert
 from .models import Comic
-from .comicvine_client import fetch_issues_by_date_range, fetch_volumes_by_ids, CVError
+from .comicvine_client import CVError, fetch_issues_by_date_range
+from .ingest import iter_issue_pages, PAGE_LIMIT, VolumeResolver
 #convert date (ie. 2025-09-06) into date obj
 def _safe_date(s: Optional[str]) -> Optional[date]:
     if not s:
@@ -47,7 +55,7 @@ def _best_description(issue: Dict[str, Any]) -> Optional[str]:
     if isinstance(deck, str) and deck.strip():
         return deck.strip()
     return None
-#convert JSON into Model 
+#convert JSON into Model (the description is split into text + compressed HTML)
 def _map_cv_issue_to_comic(issue: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
     ext_id = issue.get("id")
     doc: Dict[str, Any] = {
@@ -56,78 +64,237 @@ def _map_cv_issue_to_comic(issue: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
         "onsale_date": _safe_date(issue.get("store_date") or issue.get("cover_date")),
         "format": "Comic",
         "thumbnail_url": _best_thumb(issue),
-        "description": _best_description(issue),
+        **descriptions.columns(_best_description(issue)),
         "issue_number": issue.get("issue_number"),
         "marvel_id": ext_id,
     }
     return doc, ext_id
+#publisher name of an issue's volume ("" if we don't know it)
+def _issue_publisher(issue: Dict[str, Any], volumes: Dict[int, Dict[str, Any]]) -> str:
+    vol_id = (issue.get("volume") or {}).get("id")
+    if vol_id is None:
+        return ""
+    publisher = (volumes.get(vol_id) or {}).get("publisher") or {}
+    return (publisher.get("name") or "").strip()
+#ComicVine returns every publisher; only CV_PUBLISHER's books are kept
+def _wanted_publisher(pub_name: str) -> bool:
+    return bool(pub_name) and CV_PUBLISHER.lower() in pub_name.lower()
+#stable hash of a mapped comic doc (everything we write for a synced row)
+def _content_hash(doc: Dict[str, Any]) -> str:
+    raw = json.dumps(doc, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+#writes a page of mapped docs with one lookup query and one INSERT .. ON CONFLICT
+#rows whose content hash is unchanged are not written at all
+#returns (inserted, updated) where updated only counts rows that actually changed
+def _upsert_comics(session: Session, docs: List[Dict[str, Any]]) -> Tuple[int, int]:
+    by_id: Dict[int, Dict[str, Any]] = {}
+    for doc in docs:
+        by_id[doc["marvel_id"]] = doc  # last one wins, like the old per-row loop
+    if not by_id:
+        return 0, 0
+    for doc in by_id.values():
+        doc["content_hash"] = _content_hash(doc)
+
+    existing = dict(session.exec(
+        select(Comic.marvel_id, Comic.content_hash).where(Comic.marvel_id.in_(list(by_id)))
+    ).all())
+    rows = [
+        doc for ext_id, doc in by_id.items()
+        if ext_id not in existing or existing[ext_id] != doc["content_hash"]
+    ]
+    if not rows:
+        return 0, 0
+    inserted = sum(1 for doc in rows if doc["marvel_id"] not in existing)
+
+    table = Comic.__table__
+    insert = upsert_insert(engine)
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.marvel_id],
+        set_={k: stmt.excluded[k] for k in rows[0] if k != "marvel_id"},
+        where=table.c.content_hash.is_distinct_from(stmt.excluded.content_hash),
+    )
+    #executemany: the statement is compiled once and cached, whatever the batch size
+    session.exec(stmt, params=rows)
+    return inserted, len(rows) - inserted
+#state shared by the passes of one sync run:
+#  seen     - issue ids already handled by an earlier pass (skipped later on)
+#  volumes  - volume lookups, so a volume is only asked for once per run
+#  passes   - what each pass actually cost and wrote
+#  snapshot - optional writer that keeps the raw pages (see snapshot.py)
+class SyncRun:
+    def __init__(self, snapshot: Optional[Any] = None) -> None:
+        self.seen: Set[int] = set()
+        self.volumes = VolumeResolver()
+        self.passes: List[Dict[str, Any]] = []
+        self.snapshot = snapshot
+
+    @property
+    def inserted(self) -> int:
+        return sum(p["inserted"] for p in self.passes)
+
+    @property
+    def updated(self) -> int:
+        return sum(p["updated"] for p in self.passes)
+
+    def report(self) -> Dict[str, Any]:
+        out = {"inserted": self.inserted, "updated": self.updated, "passes": self.passes}
+        if self.snapshot is not None:
+            out["snapshot"] = str(self.snapshot.path)
+        return out
 #This func was created with the help of AI
 #sync database to only marvel comics since the api didnt only pull from Marvel
-def _sync_one_field(start_iso: str, end_iso: str, *, date_field: str) -> Tuple[int, int]:
-    inserted = updated = 0
-    offset = 0
-    LIMIT = 100
+#with updated_since, only issues ComicVine changed after that time are requested
+#with volume_ids (targeted mode), only issues of those volumes, one batch of
+#volumes at a time; targeted passes aren't checkpointed
+#probe_calls are /issues/ calls already spent deciding the mode (counted in issue_calls)
+def _sync_one_field(
+    start_iso: str,
+    end_iso: str,
+    *,
+    date_field: str,
+    run: Optional[SyncRun] = None,
+    updated_since: Optional[datetime] = None,
+    volume_ids: Optional[List[int]] = None,
+    probe_calls: int = 0,
+) -> Tuple[int, int]:
+    run = run if run is not None else SyncRun()
+    start, end = _safe_date(start_iso), _safe_date(end_iso)
+    targeted = volume_ids is not None
+    offset = 0 if targeted else coverage.resume_offset(start, end, date_field, updated_since)
+    stats = {
+        "date_field": date_field,
+        "updated_since": updated_since,
+        "issue_calls": probe_calls,
+        "volume_calls": 0,
+        "issues": 0,
+        "skipped": 0,
+        "inserted": 0,
+        "updated": 0,
+        "resumed_at": offset,
+        "mode": "targeted" if targeted else "full",
+    }
+    volume_calls_before = run.volumes.api_calls
+    batches = volume_index.batches(volume_ids) if targeted else [None]
     with Session(engine) as session:
-        while True:
-            payload = fetch_issues_by_date_range(
-                start_iso, end_iso, date_field=date_field, limit=LIMIT, offset=offset
+        #pages arrive in order; the next ones are already downloading while we write this one
+        pages = (
+            page
+            for batch in batches
+            for page in iter_issue_pages(
+                start_iso, end_iso, date_field=date_field, limit=PAGE_LIMIT,
+                volumes=run.volumes, skip=run.seen, updated_since=updated_since,
+                start_offset=offset, volume_ids=batch,
             )
-            results: List[Dict[str, Any]] = payload.get("results", [])
-            total = payload.get("number_of_total_results", 0)
-
-            vol_ids = [
-                (it.get("volume") or {}).get("id")
-                for it in results
-                if (it.get("volume") or {}).get("id")
-            ]
-            vol_ids = list(dict.fromkeys(vol_ids))
-            vol_map = fetch_volumes_by_ids(vol_ids) if vol_ids else {}
-
-            for issue in results:
-                vol_id = (issue.get("volume") or {}).get("id")
-                pub_name = ""
-                if vol_id is not None:
-                    vinfo = vol_map.get(vol_id) or {}
-                    publisher = vinfo.get("publisher") or {}
-                    pub_name = (publisher.get("name") or "").strip()
-
-                if "marvel" not in pub_name.lower():
+        )
+        for page in pages:
+            stats["issue_calls"] += 1
+            stats["issues"] += len(page.results) + page.skipped
+            stats["skipped"] += page.skipped
+            docs: List[Dict[str, Any]] = []
+            if run.snapshot is not None:
+                run.snapshot.write_page(page)
+            for issue in page.results:
+                if not _wanted_publisher(_issue_publisher(issue, page.volumes)):
                     continue
 
                 doc, ext_id = _map_cv_issue_to_comic(issue)
                 if not ext_id:
                     continue
 
-                existing = session.exec(
-                    select(Comic).where(Comic.marvel_id == ext_id)
-                ).first()
-                if existing:
-                    for k, v in doc.items():
-                        setattr(existing, k, v)
-                    updated += 1
-                else:
-                    session.add(Comic(**doc))
-                    inserted += 1
+                docs.append(doc)
 
+            ins, upd = _upsert_comics(session, docs)
+            stats["inserted"] += ins
+            stats["updated"] += upd
+            if not targeted:
+                coverage.checkpoint(session, start, end, date_field, updated_since, page.offset + PAGE_LIMIT)
+            if ins or upd:
+                response_cache.bump(session)
             session.commit()
-            offset += LIMIT
-            if offset >= total:
-                break
-    return inserted, updated
+            if COVER_PREFETCH:
+                covers.prefetch(doc["thumbnail_url"] for doc in docs)
+            run.seen.update(it["id"] for it in page.results if it.get("id") is not None)
+    stats["volume_calls"] = run.volumes.api_calls - volume_calls_before
+    run.passes.append(stats)
+    return stats["inserted"], stats["updated"]
+#volumes to crawl for a targeted pass, or None to scan the whole range instead:
+#when the volume index can't vouch for the range (too old, never refreshed),
+#or when asking per volume would take more /issues/ calls than the full scan
+#(a one-result probe gives the full scan's size)
+#the index itself is refreshed by a background job (volume_index.schedule_refresh),
+#so this costs at most the probe; returns (volume ids, /issues/ calls made)
+def _targeted_volumes(
+    start_iso: str, end_iso: str, date_field: str, updated_since: Optional[datetime],
+) -> Tuple[Optional[List[int]], int]:
+    volume_index.schedule_refresh()
+    volume_ids = volume_index.candidates(_safe_date(start_iso))
+    if volume_ids is None:
+        return None, 0
+    if not volume_ids:
+        return volume_ids, 0
+    probe = fetch_issues_by_date_range(
+        start_iso, end_iso, date_field=date_field, limit=1, updated_since=updated_since,
+    )
+    full_calls = math.ceil(probe.get("number_of_total_results", 0) / PAGE_LIMIT)
+    return (volume_ids if volume_index.targeted_calls(volume_ids) < full_calls else None), 1
 #sync store and cover dates
-def cv_sync_range_to_db(
+def cv_sync_range(
     start_iso: str,
     end_iso: str,
-    include_collections: bool = False, 
-) -> Tuple[int, int]:
+    include_collections: bool = False,
+    full: bool = False,
+    kind: str = "manual",
+    mode: Optional[str] = None,
+) -> SyncRun:
     """
-    Two passes:
+    Two passes over one shared SyncRun:
         1) store_date   (real on-sale)
-        2) cover_date   (fallback)
+        2) cover_date   (fallback) - only issues the store_date pass didn't see
+    If a pass's range was synced before (see coverage), only issues updated
+    since then are requested, unless full=True. Each finished pass is recorded.
+    kind only labels the run in /metrics (manual, auto, ...).
+    With SYNC_SNAPSHOT_DIR set, the raw pages are also saved for snapshot imports.
+    mode (default SYNC_MODE) "targeted" crawls only the publisher's active
+    volumes when the volume index allows it, and falls back to a full scan otherwise
+    (ie. until the index's first background refresh has finished).
     """
-    ins1, upd1 = _sync_one_field(start_iso, end_iso, date_field="store_date")
-    ins2, upd2 = _sync_one_field(start_iso, end_iso, date_field="cover_date")
-    return ins1 + ins2, upd1 + upd2
+    t0 = time.perf_counter()
+    writer = None
+    if SYNC_SNAPSHOT_DIR:
+        from .snapshot import SnapshotWriter
+        writer = SnapshotWriter.for_range(SYNC_SNAPSHOT_DIR, start_iso, end_iso)
+    run = SyncRun(snapshot=writer)
+    start, end = _safe_date(start_iso), _safe_date(end_iso)
+    try:
+        for field in coverage.DATE_FIELDS:
+            started_at = datetime.utcnow()
+            since = None if full else coverage.updated_since(start, end, field)
+            volume_ids, probe_calls = None, 0
+            if (mode or SYNC_MODE) == "targeted":
+                volume_ids, probe_calls = _targeted_volumes(start_iso, end_iso, field, since)
+            _sync_one_field(
+                start_iso, end_iso, date_field=field, run=run, updated_since=since, volume_ids=volume_ids,
+                probe_calls=probe_calls,
+            )
+            coverage.record(start, end, field, started_at)
+    finally:
+        if writer is not None:
+            writer.close()
+        if run.inserted or run.updated:
+            suggest.refresh()
+    metrics.sync_duration.observe(time.perf_counter() - t0, kind)
+    metrics.sync_rows.inc("inserted", amount=run.inserted)
+    metrics.sync_rows.inc("updated", amount=run.updated)
+    return run
+
+def cv_sync_range_to_db(
+    start_iso: str,
+    end_iso: str,
+    include_collections: bool = False, 
+) -> Tuple[int, int]:
+    run = cv_sync_range(start_iso, end_iso, include_collections=include_collections)
+    return run.inserted, run.updated
 
 # Back-compat adapter (old "marvel" name)
 #since the original plan was to use Marvel's own API, I added this in case I wanted to try again
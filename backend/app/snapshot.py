@@ -0,0 +1,204 @@
+#snapshot.py
+#offline ComicVine snapshots: gzipped NDJSON files of raw /issues/ and
+#/volumes/ results, one record per line:
+#  {"resource": "volumes", "result": {...}}
+#  {"resource": "issues", "result": {...}}
+#a sync writes one when SYNC_SNAPSHOT_DIR is set; importing one fills the
+#database through the same mapping and publisher filter as a live sync
+#
+#  cd backend
+#  python -m app.snapshot import snapshots/*.ndjson.gz --workers 8
+from __future__ import annotations
+import argparse
+import gzip
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlmodel import Session
+
+from . import response_cache, volume_cache
+from .db import engine, init_db
+from .ingest import Page
+from .services import _issue_publisher, _map_cv_issue_to_comic, _upsert_comics, _wanted_publisher
+
+#lines per parse job handed to a worker process
+CHUNK_LINES = 2000
+#docs per INSERT .. ON CONFLICT (keeps SQLite under its bound-parameter limit)
+UPSERT_BATCH = 1000
+#rows per transaction
+TXN_ROWS = 50_000
+
+class SnapshotWriter:
+    """Appends sync pages to a gzipped NDJSON file; each volume is written once, before its issues."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = gzip.open(path, "wt", encoding="utf-8")
+        self._volumes: Set[int] = set()
+
+    @classmethod
+    def for_range(cls, directory: str, start_iso: str, end_iso: str) -> "SnapshotWriter":
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        return cls(Path(directory) / f"cv-{start_iso}-{end_iso}-{stamp}.ndjson.gz")
+
+    def _line(self, resource: str, result: Dict[str, Any]) -> None:
+        self._fh.write(json.dumps({"resource": resource, "result": result}, ensure_ascii=False) + "\n")
+
+    def write_page(self, page: Page) -> None:
+        for vid, vol in page.volumes.items():
+            if vid not in self._volumes:
+                self._volumes.add(vid)
+                self._line("volumes", vol)
+        for issue in page.results:
+            self._line("issues", issue)
+
+    def close(self) -> None:
+        self._fh.close()
+
+#--- import ---------------------------------------------------------------------
+#runs in a worker process: raw lines -> (volumes, [(publisher volume id, mapped doc)])
+def _parse_chunk(lines: List[bytes]) -> Tuple[List[Dict[str, Any]], List[Tuple[Optional[int], Dict[str, Any]]]]:
+    volumes: List[Dict[str, Any]] = []
+    issues: List[Tuple[Optional[int], Dict[str, Any]]] = []
+    for line in lines:
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        result = rec.get("result") or {}
+        if rec.get("resource") == "volumes":
+            volumes.append(result)
+        elif rec.get("resource") == "issues":
+            doc, ext_id = _map_cv_issue_to_comic(result)
+            if ext_id:
+                issues.append(((result.get("volume") or {}).get("id"), doc))
+    return volumes, issues
+
+def _chunks(paths: Iterable[str]) -> Iterator[List[bytes]]:
+    buf: List[bytes] = []
+    for path in paths:
+        with gzip.open(path, "rb") as fh:
+            for line in fh:
+                buf.append(line)
+                if len(buf) >= CHUNK_LINES:
+                    yield buf
+                    buf = []
+    if buf:
+        yield buf
+
+#parsed chunks in file order, with up to 2 jobs per worker in flight
+def _parsed(paths: Iterable[str], workers: int) -> Iterator[Tuple[List[Dict[str, Any]], list]]:
+    if workers <= 1:
+        for chunk in _chunks(paths):
+            yield _parse_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in _chunks(paths):
+            pending.append(pool.submit(_parse_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class _Writer:
+    """Buffers docs and upserts them in large transactions."""
+
+    def __init__(self) -> None:
+        self.session = Session(engine)
+        self.buffer: List[Dict[str, Any]] = []
+        self.in_txn = 0
+        self.inserted = self.updated = 0
+        self.changed = False
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        self.buffer.append(doc)
+        if len(self.buffer) >= UPSERT_BATCH:
+            self.flush()
+
+    def flush(self, commit: bool = False) -> None:
+        if self.buffer:
+            ins, upd = _upsert_comics(self.session, self.buffer)
+            self.inserted += ins
+            self.updated += upd
+            self.changed = self.changed or bool(ins or upd)
+            self.in_txn += len(self.buffer)
+            self.buffer = []
+        if commit or self.in_txn >= TXN_ROWS:
+            #the running server sees the new rows through the catalog version
+            if self.changed:
+                response_cache.bump(self.session)
+                self.changed = False
+            self.session.commit()
+            self.in_txn = 0
+
+    def close(self) -> None:
+        self.flush(commit=True)
+        self.session.close()
+
+def import_snapshots(paths: List[str], *, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Load snapshot files into the database. Volumes are stored in the volume
+    cache; issues go through _map_cv_issue_to_comic and the publisher filter.
+    Issues whose volume isn't in the snapshot are checked against the volume
+    cache at the end (nothing is fetched from ComicVine).
+    """
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    stats = {"files": len(paths), "volumes": 0, "issues": 0, "kept": 0, "other_publisher": 0,
+             "unknown_volume": 0}
+    publishers: Dict[int, Dict[str, Any]] = {}
+    deferred: List[Tuple[Optional[int], Dict[str, Any]]] = []
+    writer = _Writer()
+
+    def _keep(vol_id: Optional[int], doc: Dict[str, Any], vols: Dict[int, Dict[str, Any]]) -> None:
+        if _wanted_publisher(_issue_publisher({"volume": {"id": vol_id}}, vols)):
+            stats["kept"] += 1
+            writer.add(doc)
+        else:
+            stats["other_publisher"] += 1
+
+    try:
+        for volumes, issues in _parsed(paths, workers):
+            if volumes:
+                stats["volumes"] += volume_cache.seed(volumes)
+                publishers.update((v["id"], v) for v in volumes if isinstance(v.get("id"), int))
+            stats["issues"] += len(issues)
+            for vol_id, doc in issues:
+                if vol_id in publishers:
+                    _keep(vol_id, doc, publishers)
+                else:
+                    deferred.append((vol_id, doc))
+        if deferred:
+            cached = volume_cache.known(vid for vid, _ in deferred)
+            for vol_id, doc in deferred:
+                if vol_id in publishers or vol_id in cached:
+                    _keep(vol_id, doc, publishers if vol_id in publishers else cached)
+                else:
+                    stats["unknown_volume"] += 1
+    finally:
+        writer.close()
+    stats.update(inserted=writer.inserted, updated=writer.updated,
+                 seconds=round(time.perf_counter() - t0, 3))
+    return stats
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="ComicVine snapshot tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="load gzipped NDJSON snapshots into the database")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    args = ap.parse_args()
+
+    init_db()
+    stats = import_snapshots(args.paths, workers=args.workers)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
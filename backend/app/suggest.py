@@ -0,0 +1,268 @@
+#suggest.py
+#search-as-you-type over series names (the volume part of a title: "Amazing
+#Spider-Man #12" -> "Amazing Spider-Man") with how many issues each has
+#series_count is kept current by triggers on comic (like comic_fts), and every
+#process keeps an in-memory prefix index over it: a sorted list of word-start
+#keys searched with bisect, plus precomputed top results for 1-2 letter
+#prefixes, which would otherwise match a large part of the list
+#the index remembers the catalog version (response_cache.py) it was read at;
+#a write from any process (another worker's sync, a snapshot import) bumps
+#that. requests compare it with the version response_cache last saw (memory
+#only) and read the stored one at most every VERSION_CHECK_EVERY seconds, so
+#a keystroke normally doesn't touch the database
+from __future__ import annotations
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from . import response_cache
+from .config import SUGGEST_MAX_SERIES
+from .db import engine, has_sqlite_object
+from .models import Comic, SeriesCount
+
+#prefixes up to this long are answered from precomputed lists
+TOP_PREFIX_LEN = 2
+#results kept per precomputed prefix (the most a request can ask for)
+MAX_K = 20
+#keys examined for a longer prefix before giving up on finding better matches
+SCAN_LIMIT = 5000
+#seconds between reads of the stored catalog version
+VERSION_CHECK_EVERY = 2.0
+
+#series part of a title, same rule as the SQL below
+def series_of(title: str) -> str:
+    return title.split(" #", 1)[0].strip()
+
+_SERIES_SQL = "trim(CASE WHEN instr({t}, ' #') > 0 THEN substr({t}, 1, instr({t}, ' #') - 1) ELSE {t} END)"
+
+def _bump(title: str, n: int) -> str:
+    s = _SERIES_SQL.format(t=title)
+    return (
+        f"INSERT INTO series_count(series, count, updated_at) VALUES ({s}, {n}, julianday('now')) "
+        f"ON CONFLICT(series) DO UPDATE SET count = count + ({n}), updated_at = julianday('now');"
+    )
+
+_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS series_count_ai AFTER INSERT ON comic BEGIN
+        {_bump("new.title", 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS series_count_ad AFTER DELETE ON comic BEGIN
+        {_bump("old.title", -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS series_count_au AFTER UPDATE OF title ON comic
+    WHEN old.title IS NOT new.title BEGIN
+        {_bump("old.title", -1)}
+        {_bump("new.title", 1)}
+    END
+    """,
+]
+
+_triggers = False
+
+#creates the series_count triggers (SQLite only), backfilling the table the first time
+def ensure_series_counts(e: Engine) -> bool:
+    if e.dialect.name != "sqlite":
+        return False
+    with e.begin() as conn:
+        existed = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='series_count_ai'"
+        ).first()
+        if not existed:
+            s = _SERIES_SQL.format(t="title")
+            conn.exec_driver_sql("DELETE FROM series_count")
+            conn.exec_driver_sql(
+                f"INSERT INTO series_count(series, count, updated_at) "
+                f"SELECT {s}, count(*), julianday('now') FROM comic GROUP BY 1"
+            )
+        for ddl in _DDL:
+            conn.exec_driver_sql(ddl)
+    return True
+
+#at startup, after the migrations: read series_count if its triggers exist
+def detect(e: Engine) -> bool:
+    global _triggers
+    _triggers = has_sqlite_object(e, "trigger", "series_count_ai")
+    return _triggers
+
+#lowercase, no accents, words separated by single spaces ("Spider-Man" -> "spider man")
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+#every word start of a normalized name, so "man" also finds "amazing spider man"
+def _word_keys(norm: str) -> List[str]:
+    words = norm.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+class SuggestIndex:
+    def __init__(self) -> None:
+        self.counts: Dict[str, int] = {}                 # series -> issues
+        self.keys: List[Tuple[str, str]] = []            # sorted (word-start key, series)
+        self.top: Dict[str, List[str]] = {}              # short prefix -> best series
+        self.seen_until: Optional[float] = None          # newest series_count.updated_at applied
+        self.version: Optional[int] = None               # catalog version the counts were read at
+        self.checked_at = 0.0                            # monotonic time of the last version read
+        self.lock = threading.RLock()
+
+    #--- building ---------------------------------------------------------------
+    def load(self, rows: List[Tuple[str, int, Optional[float]]]) -> None:
+        rows = [r for r in rows if r[0] and r[1] > 0]
+        rows = heapq.nlargest(SUGGEST_MAX_SERIES, rows, key=lambda r: r[1])
+        counts = {series: n for series, n, _ in rows}
+        keys = sorted((k, series) for series in counts for k in _word_keys(normalize(series)) if k)
+        #each short prefix's members are gathered first and ranked once
+        buckets: Dict[str, Set[str]] = {}
+        for key, series in keys:
+            for n in range(1, min(TOP_PREFIX_LEN, len(key)) + 1):
+                buckets.setdefault(key[:n], set()).add(series)
+        rank = lambda series: (-counts[series], series)
+        top = {prefix: heapq.nsmallest(MAX_K, members, key=rank) for prefix, members in buckets.items()}
+        with self.lock:
+            self.counts, self.keys, self.top = counts, keys, top
+            stamps = [r[2] for r in rows if r[2] is not None]
+            self.seen_until = max(stamps) if stamps else self.seen_until
+
+    def _rank(self, series: str) -> Tuple[int, str]:
+        return (-self.counts.get(series, 0), series)
+
+    #puts series into a precomputed top list if it belongs there
+    def _offer(self, prefix: str, series: str) -> None:
+        top = self.top.setdefault(prefix, [])
+        if series in top:
+            top.sort(key=self._rank)
+            return
+        if len(top) < MAX_K or self._rank(series) < self._rank(top[-1]):
+            top.append(series)
+            top.sort(key=self._rank)
+            del top[MAX_K:]
+
+    #recomputes a precomputed list from the sorted keys (after a count went down)
+    def _rescan(self, prefix: str) -> None:
+        lo = bisect_left(self.keys, (prefix,))
+        found = set()
+        for key, series in self.keys[lo:]:
+            if not key.startswith(prefix):
+                break
+            found.add(series)
+        self.top[prefix] = heapq.nsmallest(MAX_K, found, key=self._rank)
+
+    #new absolute counts for some series (0 removes one)
+    def apply(self, rows: List[Tuple[str, int, Optional[float]]]) -> None:
+        stale: Set[str] = set()  # precomputed lists that lost a member or one went down
+        with self.lock:
+            for series, n, stamp in rows:
+                if stamp is not None and (self.seen_until is None or stamp > self.seen_until):
+                    self.seen_until = stamp
+                if not series:
+                    continue
+                old = self.counts.get(series)
+                word_keys = [k for k in _word_keys(normalize(series)) if k]
+                prefixes = {k[:i] for k in word_keys for i in range(1, min(TOP_PREFIX_LEN, len(k)) + 1)}
+                if n <= 0 or (old is None and len(self.counts) >= SUGGEST_MAX_SERIES):
+                    if old is None:
+                        continue
+                    del self.counts[series]
+                    for k in word_keys:
+                        i = bisect_left(self.keys, (k, series))
+                        if i < len(self.keys) and self.keys[i] == (k, series):
+                            del self.keys[i]
+                    stale.update(p for p in prefixes if series in self.top.get(p, ()))
+                    continue
+                self.counts[series] = n
+                if old is None:
+                    for k in word_keys:
+                        insort(self.keys, (k, series))
+                if old is not None and n < old:
+                    stale.update(p for p in prefixes if series in self.top.get(p, ()))
+                else:
+                    for p in prefixes:
+                        self._offer(p, series)
+            for p in stale:
+                self._rescan(p)
+
+    #--- querying ---------------------------------------------------------------
+    def complete(self, text: str, k: int = 10) -> List[Tuple[str, int]]:
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        k = max(1, min(k, MAX_K))
+        with self.lock:
+            if len(prefix) <= TOP_PREFIX_LEN:
+                best = self.top.get(prefix, [])[:k]
+            else:
+                lo = bisect_left(self.keys, (prefix,))
+                found = set()
+                for key, series in self.keys[lo:lo + SCAN_LIMIT]:
+                    if not key.startswith(prefix):
+                        break
+                    found.add(series)
+                best = heapq.nsmallest(k, found, key=self._rank)
+            return [(series, self.counts[series]) for series in best]
+
+_index = SuggestIndex()
+
+def _rows(s: Session, since: Optional[float] = None) -> List[Tuple[str, int, Optional[float]]]:
+    if _triggers:
+        stmt = select(SeriesCount.series, SeriesCount.count, SeriesCount.updated_at)
+        if since is not None:
+            stmt = stmt.where(SeriesCount.updated_at >= since)
+        return list(s.exec(stmt).all())
+    #no triggers (not SQLite): count from the titles
+    counts: Dict[str, int] = {}
+    for title, n in s.exec(select(Comic.title, func.count()).group_by(Comic.title)).all():
+        counts[series_of(title)] = counts.get(series_of(title), 0) + n
+    return [(series, n, None) for series, n in counts.items()]
+
+#full build (startup, bulk imports)
+def build() -> SuggestIndex:
+    with Session(engine) as s:
+        version = response_cache.load_version(s)
+        _index.load(_rows(s))
+    _index.version, _index.checked_at = version, time.monotonic()
+    return _index
+
+#applies series whose counts changed since the last build/refresh
+def refresh() -> SuggestIndex:
+    if not _triggers:
+        return build()
+    with Session(engine) as s:
+        version = response_cache.load_version(s)
+        rows = _rows(s, since=_index.seen_until)
+    _index.apply(rows)
+    _index.version, _index.checked_at = version, time.monotonic()
+    return _index
+
+#whether the index may be behind: the catalog changed as far as this process
+#knows, or the stored version is due for another look (no I/O)
+def stale() -> bool:
+    return (
+        _index.version != response_cache.catalog_version()
+        or time.monotonic() - _index.checked_at >= VERSION_CHECK_EVERY
+    )
+
+#reads the stored catalog version and applies the changed counts if it moved
+def catch_up() -> SuggestIndex:
+    with Session(engine) as s:
+        version = response_cache.observe(response_cache.load_version(s))
+    _index.checked_at = time.monotonic()
+    if version != _index.version:
+        refresh()
+    return _index
+
+#answers from the index as it is (see stale/catch_up)
+def complete(text: str, k: int = 10) -> List[Tuple[str, int]]:
+    return _index.complete(text, k)
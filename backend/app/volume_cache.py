@@ -0,0 +1,155 @@
+#volume_cache.py
+#volume -> publisher lookups, cached in the Volume table and an in-process LRU
+#a volume's publisher practically never changes, so we only go back to
+#ComicVine for ids we have never seen or whose entry is older than the TTL
+#ids ComicVine left out of a response are remembered too (no name, no
+#publisher), but only for the much shorter miss TTL: a partial response
+#shouldn't hide a volume's issues for a month
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlmodel import Session, delete, select
+
+from .config import CV_VOLUME_CACHE_SIZE, CV_VOLUME_MISS_TTL_HOURS, CV_VOLUME_TTL_DAYS
+from .db import engine, upsert_insert
+from .models import Volume
+from .comicvine_client import fetch_volumes_by_ids
+
+#id -> (name, publisher, fetched_at)
+Entry = Tuple[Optional[str], Optional[str], datetime]
+
+_lru: "OrderedDict[int, Entry]" = OrderedDict()
+_lock = threading.Lock()
+
+def _ttl() -> timedelta:
+    return timedelta(days=CV_VOLUME_TTL_DAYS)
+
+def _miss_ttl() -> timedelta:
+    return timedelta(hours=CV_VOLUME_MISS_TTL_HOURS)
+
+#a volume ComicVine didn't return (every real volume has a name)
+def _is_miss(entry: Entry) -> bool:
+    return entry[0] is None
+
+def _remember(vid: int, entry: Entry) -> None:
+    with _lock:
+        _lru[vid] = entry
+        _lru.move_to_end(vid)
+        while len(_lru) > CV_VOLUME_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+#entry in the same shape ComicVine returns from /volumes/
+def _as_cv(vid: int, entry: Entry) -> Dict[str, Any]:
+    name, publisher, _ = entry
+    return {"id": vid, "name": name, "publisher": {"name": publisher} if publisher else None}
+
+#entries fetched at or after `cutoff` (`miss_cutoff` for misses), from
+#memory, then from the Volume table
+def _cached(ids: List[int], cutoff: datetime, miss_cutoff: Optional[datetime] = None) -> Dict[int, Entry]:
+    miss_cutoff = cutoff if miss_cutoff is None else miss_cutoff
+
+    def fresh(entry: Entry) -> bool:
+        return entry[2] >= (miss_cutoff if _is_miss(entry) else cutoff)
+
+    found: Dict[int, Entry] = {}
+    with _lock:
+        for vid in ids:
+            entry = _lru.get(vid)
+            if entry and fresh(entry):
+                _lru.move_to_end(vid)
+                found[vid] = entry
+    rest = [vid for vid in ids if vid not in found]
+    if rest:
+        with Session(engine) as s:
+            rows = s.exec(
+                select(Volume).where(Volume.id.in_(rest), Volume.fetched_at >= min(cutoff, miss_cutoff))
+            ).all()
+        for v in rows:
+            entry = (v.name, v.publisher, v.fetched_at)
+            if fresh(entry):
+                found[v.id] = entry
+                _remember(v.id, entry)
+    return found
+
+def _store(entries: Dict[int, Entry]) -> None:
+    if not entries:
+        return
+    rows = [
+        {"id": vid, "name": name, "publisher": publisher, "fetched_at": fetched_at}
+        for vid, (name, publisher, fetched_at) in entries.items()
+    ]
+    table = Volume.__table__
+    insert = upsert_insert(engine)
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={k: stmt.excluded[k] for k in ("name", "publisher", "fetched_at")},
+    )
+    with Session(engine) as s:
+        s.exec(stmt)
+        s.commit()
+    for vid, entry in entries.items():
+        _remember(vid, entry)
+
+def resolve_volumes(ids: Iterable[int]) -> Tuple[Dict[int, Dict[str, Any]], int]:
+    """
+    Return ({volume_id: volume}, number of ids that had to be fetched from ComicVine).
+    Volumes ComicVine doesn't return are cached with no publisher, so they
+    aren't asked for again until the (short) miss TTL runs out.
+    """
+    ids = list(dict.fromkeys(i for i in ids if isinstance(i, int)))
+    if not ids:
+        return {}, 0
+    now = datetime.utcnow()
+    found = _cached(ids, now - _ttl(), now - _miss_ttl())
+    missing = [vid for vid in ids if vid not in found]
+    if missing:
+        got = fetch_volumes_by_ids(missing)
+        fresh: Dict[int, Entry] = {}
+        for vid in missing:
+            v = got.get(vid) or {}
+            publisher = ((v.get("publisher") or {}).get("name") or "").strip() or None
+            fresh[vid] = (v.get("name"), publisher, now)
+        _store(fresh)
+        found.update(fresh)
+    return {vid: _as_cv(vid, found[vid]) for vid in ids}, len(missing)
+
+#volumes we already have, however old, without going to ComicVine
+#(for offline imports, see snapshot.py)
+def known(ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    ids = list(dict.fromkeys(i for i in ids if isinstance(i, int)))
+    found = _cached(ids, datetime.min) if ids else {}
+    return {vid: _as_cv(vid, entry) for vid, entry in found.items()}
+
+#stores volumes in ComicVine's /volumes/ shape (ie. from a snapshot) as freshly fetched
+def seed(volumes: Iterable[Dict[str, Any]], batch: int = 2000) -> int:
+    now = datetime.utcnow()
+    entries: Dict[int, Entry] = {}
+    for v in volumes:
+        if isinstance(v.get("id"), int):
+            publisher = ((v.get("publisher") or {}).get("name") or "").strip() or None
+            entries[v["id"]] = (v.get("name"), publisher, now)
+    items = list(entries.items())
+    for i in range(0, len(items), batch):
+        _store(dict(items[i:i + batch]))
+    return len(entries)
+
+#forget some volumes (or all of them) so the next sync asks ComicVine again
+def invalidate(ids: Optional[Iterable[int]] = None) -> int:
+    with Session(engine) as s:
+        stmt = delete(Volume)
+        if ids is not None:
+            ids = list(ids)
+            stmt = stmt.where(Volume.id.in_(ids))
+        n = s.exec(stmt).rowcount
+        s.commit()
+    with _lock:
+        if ids is None:
+            _lru.clear()
+        else:
+            for vid in ids:
+                _lru.pop(vid, None)
+    return n
@@ -0,0 +1,215 @@
+#volume_index.py
+#local index of the tracked publisher's volumes, for SYNC_MODE=targeted
+#the Volume table already caches every volume's publisher; this module keeps
+#ComicVine's date_last_updated (cv_updated) current by reading the /volumes/
+#change feed, so "which of our publisher's volumes could have issues in this
+#range" becomes a local query. a volume gets a new date_last_updated whenever
+#an issue is added to it, so volumes nobody touched since well before a range
+#starts can't have new issues in it
+#refreshes run as their own background job (schedule_refresh), never inside
+#a sync and never queued behind one: the first one pages a year of
+#all-publisher changes. each run makes at most CV_VOLUME_REFRESH_MAX_CALLS
+#/volumes/ requests and checkpoints its offset (volume_refresh_state), the
+#rest waits for the next run, so the shared budget isn't drained. a claim in
+#the same row keeps other processes (ie. other uvicorn workers) from running
+#it at the same time. until the index reaches back far enough, targeted syncs
+#fall back to the full scan
+from __future__ import annotations
+import logging
+import math
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, or_, update
+from sqlmodel import Session, func, select
+
+from . import coverage, jobs, volume_cache
+from .comicvine_client import fetch_volumes_updated_since
+from .config import (
+    CV_PUBLISHER, CV_VOLUME_ACTIVE_DAYS, CV_VOLUME_BOOTSTRAP_DAYS,
+    CV_VOLUME_REFRESH_MAX_CALLS, CV_VOLUME_REFRESH_PAUSE_MINUTES,
+)
+from .db import engine, upsert_insert
+from .models import Volume, VolumeRefresh, VolumeRefreshState
+
+PAGE_LIMIT = 100
+#volume ids per /issues/ request in targeted mode
+VOLUME_FILTER_BATCH = 100
+#the index is refreshed at most this often (unless forced)
+REFRESH_EVERY = timedelta(hours=12)
+#a claim not renewed for this long was left by a process that died; it's
+#renewed every page, so this only has to outlast one rate-limited request
+CLAIM_TTL = timedelta(minutes=15)
+
+log = logging.getLogger(__name__)
+#identifies this process's claim on the refresh
+_owner = uuid.uuid4().hex
+_state = VolumeRefreshState.__table__
+
+def _parse(ts: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") if ts else None
+    except ValueError:
+        return None
+
+def last_refresh() -> Optional[datetime]:
+    with Session(engine) as s:
+        return s.exec(select(func.max(VolumeRefresh.refreshed_at))).one()
+
+#oldest change the index has seen: volumes updated after this are all known
+def horizon() -> Optional[datetime]:
+    with Session(engine) as s:
+        return s.exec(select(func.min(VolumeRefresh.since))).one()
+
+#the unfinished refresh's state, or None if there's none worth resuming
+#(a stale checkpoint is dropped like coverage.resume_offset drops one)
+def _unfinished(state: Optional[VolumeRefreshState]) -> Optional[VolumeRefreshState]:
+    if state is None or state.since is None or state.updated_at is None:
+        return None
+    if datetime.utcnow() - state.updated_at >= coverage.CHECKPOINT_MAX_AGE:
+        return None
+    return state
+
+def _load_state() -> Optional[VolumeRefreshState]:
+    with Session(engine) as s:
+        return s.get(VolumeRefreshState, 1)
+
+def is_due() -> bool:
+    if _unfinished(_load_state()) is not None:
+        return True
+    last = last_refresh()
+    return last is None or datetime.utcnow() - last >= REFRESH_EVERY
+
+#takes the refresh for this process unless another one holds a live claim;
+#returns the state row as claimed, or None
+def _claim() -> Optional[VolumeRefreshState]:
+    now = datetime.utcnow()
+    insert = upsert_insert(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(_state).values(id=1, next_offset=0, volumes=0).on_conflict_do_nothing(index_elements=["id"]))
+        claimed = conn.execute(
+            update(_state)
+            .where(_state.c.id == 1, or_(
+                _state.c.claimed_by.is_(None),
+                _state.c.claimed_by == _owner,
+                _state.c.claimed_at < now - CLAIM_TTL,
+            ))
+            .values(claimed_by=_owner, claimed_at=now)
+        ).rowcount
+    return _load_state() if claimed else None
+
+#saves progress and renews the claim; False if another process took it over
+def _checkpoint(since: datetime, started_at: datetime, next_offset: int, volumes: int) -> bool:
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        return conn.execute(
+            update(_state)
+            .where(_state.c.id == 1, _state.c.claimed_by == _owner)
+            .values(
+                claimed_at=now, since=since, started_at=started_at,
+                next_offset=next_offset, volumes=volumes, updated_at=now,
+            )
+        ).rowcount == 1
+
+#gives the claim up; a finished refresh also clears its checkpoint and is
+#recorded in volume_refresh, in the same transaction
+def _release(finished: Optional[VolumeRefresh] = None) -> None:
+    values: Dict[str, Any] = {"claimed_by": None, "claimed_at": None}
+    if finished is not None:
+        values.update(since=None, started_at=None, next_offset=0, volumes=0, updated_at=None)
+    with Session(engine) as s:
+        released = s.exec(update(_state).where(_state.c.id == 1, _state.c.claimed_by == _owner).values(**values)).rowcount
+        if released and finished is not None:
+            s.add(finished)
+        s.commit()
+
+#reads /volumes/ changed since the last refresh into the volume cache
+#(the first refresh reaches back CV_VOLUME_BOOTSTRAP_DAYS), at most
+#`max_calls` pages per run; an unfinished refresh is resumed from its checkpoint
+def refresh(force: bool = False, max_calls: int = CV_VOLUME_REFRESH_MAX_CALLS) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    last = last_refresh()
+    resuming = _unfinished(_load_state()) is not None
+    if not force and not resuming and last is not None and now - last < REFRESH_EVERY:
+        return {"refreshed": False, "last_refresh": last}
+    state = _claim()
+    if state is None:
+        return {"refreshed": False, "claimed_elsewhere": True}
+    finished = None
+    try:
+        if _unfinished(state) is not None:
+            since, started_at, offset, seen = state.since, state.started_at or now, state.next_offset, state.volumes
+        else:
+            since = last - coverage.INCREMENTAL_OVERLAP if last else now - timedelta(days=CV_VOLUME_BOOTSTRAP_DAYS)
+            started_at, offset, seen = now, 0, 0
+        calls = 0
+        while calls < max_calls:
+            payload = fetch_volumes_updated_since(since, limit=PAGE_LIMIT, offset=offset)
+            calls += 1
+            results = payload.get("results", [])
+            _store(results)
+            seen += len(results)
+            offset += PAGE_LIMIT
+            if not results or offset >= payload.get("number_of_total_results", 0):
+                finished = VolumeRefresh(since=since, refreshed_at=started_at, volumes=seen)
+                break
+            if not _checkpoint(since, started_at, offset, seen):
+                log.warning("volume index refresh was taken over by another process at offset %d", offset)
+                break
+    finally:
+        _release(finished)
+    report = {"refreshed": finished is not None, "since": since, "volumes": seen, "api_calls": calls}
+    if finished is None:
+        report["next_offset"] = offset
+    return report
+
+#background job body: runs one capped refresh and, if it stopped short,
+#schedules the next run after the pause
+def _refresh_job() -> Dict[str, Any]:
+    report = refresh()
+    if "next_offset" in report:
+        timer = threading.Timer(CV_VOLUME_REFRESH_PAUSE_MINUTES * 60, schedule_refresh)
+        timer.daemon = True
+        timer.start()
+    return report
+
+#starts a background refresh if one is due (single-flight, see jobs.py);
+#returns its job, or None if the index is recent enough
+def schedule_refresh() -> Optional[jobs.Job]:
+    if not is_due():
+        return None
+    return jobs.submit_background("cv-volume-refresh", _refresh_job)
+
+def _store(results: List[Dict[str, Any]]) -> None:
+    if not results:
+        return
+    volume_cache.seed(results)
+    rows = [
+        {"vid": v["id"], "cv_updated": _parse(v.get("date_last_updated"))}
+        for v in results if isinstance(v.get("id"), int)
+    ]
+    stmt = update(Volume).where(Volume.id == bindparam("vid")).values(cv_updated=bindparam("cv_updated"))
+    with engine.begin() as conn:
+        conn.execute(stmt, rows)
+
+#publisher's volumes that may have issues in a range starting at `start`,
+#or None if the index doesn't reach back far enough to answer that
+def candidates(start: date) -> Optional[List[int]]:
+    cutoff = datetime.combine(start, datetime.min.time()) - timedelta(days=CV_VOLUME_ACTIVE_DAYS)
+    reach = horizon()
+    if reach is None or cutoff < reach:
+        return None
+    with Session(engine) as s:
+        stmt = select(Volume.id).where(Volume.cv_updated >= cutoff)
+        if CV_PUBLISHER:
+            stmt = stmt.where(func.lower(Volume.publisher).contains(CV_PUBLISHER.lower()))
+        return list(s.exec(stmt.order_by(Volume.id)).all())
+
+#/issues/ requests a targeted crawl of these volumes needs (one page per batch at least)
+def targeted_calls(volume_ids: List[int]) -> int:
+    return math.ceil(len(volume_ids) / VOLUME_FILTER_BATCH)
+
+def batches(volume_ids: List[int]) -> List[List[int]]:
+    return [volume_ids[i:i + VOLUME_FILTER_BATCH] for i in range(0, len(volume_ids), VOLUME_FILTER_BATCH)]
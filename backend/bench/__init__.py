@@ -0,0 +1 @@
+#bench: offline benchmarks (see bench/run.py)
@@ -0,0 +1,206 @@
+#fake_comicvine.py
+#local stand-in for the ComicVine /issues/ and /volumes/ endpoints
+#serves a deterministic synthetic catalog with configurable size, latency and
+#page size, and counts the calls it gets so benchmarks can report calls/issue
+#
+#  python -m bench.fake_comicvine --port 8765 --issues 5000 --latency-ms 80
+#  CV_BASE_URL=http://127.0.0.1:8765 CV_API_KEY=x uvicorn app.main:app
+from __future__ import annotations
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+PUBLISHERS = ["Marvel", "DC Comics", "Image", "Dark Horse Comics", "BOOM! Studios"]
+
+class FakeComicVine:
+    def __init__(
+        self,
+        *,
+        issues: int = 5000,
+        volumes: int = 400,
+        start: date = date(2025, 1, 1),
+        days: int = 365,
+        marvel_share: float = 0.35,
+        latency_ms: float = 0.0,
+        max_page: int = 100,
+        description_bytes: int = 2000,
+        seed: int = 1,
+    ) -> None:
+        self.latency = latency_ms / 1000.0
+        self.max_page = max_page
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.base_url = ""
+        rnd = random.Random(seed)
+
+        self.volumes: Dict[int, Dict[str, Any]] = {}
+        for vid in range(1, volumes + 1):
+            pub = "Marvel" if rnd.random() < marvel_share else rnd.choice(PUBLISHERS[1:])
+            self.volumes[vid] = {
+                "id": vid,
+                "name": f"{rnd.choice(['Amazing', 'Uncanny', 'Ultimate', 'Savage', 'Mighty'])} Series {vid}",
+                "publisher": {"id": PUBLISHERS.index(pub) + 1, "name": pub},
+                "date_last_updated": "2025-01-01 00:00:00",
+            }
+        filler = "<p>" + ("Lorem ipsum dolor sit amet. " * (description_bytes // 28 + 1))[:description_bytes] + "</p>"
+        self.issues: List[Dict[str, Any]] = []
+        for n in range(1, issues + 1):
+            vid = rnd.randint(1, volumes)
+            store = start + timedelta(days=rnd.randrange(days))
+            cover = store + timedelta(days=rnd.randint(30, 75))
+            self.issues.append({
+                "id": 100000 + n,
+                "issue_number": str(rnd.randint(1, 120)),
+                "name": None,
+                "volume": {"id": vid, "name": self.volumes[vid]["name"]},
+                #about 1 in 8 issues only has a cover date, like the real API
+                "store_date": store.isoformat() if n % 8 else None,
+                "cover_date": cover.isoformat(),
+                "image": {"small_url": f"/img/{n}.jpg", "thumb_url": f"/img/{n}.jpg"},
+                "description": filler,
+                "deck": None,
+                "date_last_updated": "2025-01-01 00:00:00",
+            })
+
+    #--- request handling ---------------------------------------------------
+    @staticmethod
+    def _filters(raw: str) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        last = None
+        for part in (raw or "").split(","):
+            if ":" in part:
+                last, value = part.split(":", 1)
+                out[last] = value
+            elif last:
+                out[last] += "," + part  # id:1,2,3
+        return out
+
+    def _issues(self, qs: Dict[str, str]) -> Dict[str, Any]:
+        filt = self._filters(qs.get("filter", ""))
+        rows = self.issues
+        for field in ("store_date", "cover_date", "date_last_updated"):
+            if field in filt:
+                lo, hi = filt[field].split("|")
+                rows = [r for r in rows if r.get(field) and lo[:10] <= r[field][:10] <= hi[:10]]
+        if "volume" in filt:
+            ids = {int(x) for x in filt["volume"].split("|") if x}
+            rows = [r for r in rows if r["volume"]["id"] in ids]
+        if "sort" in qs:
+            field = qs["sort"].split(":")[0]
+            rows = sorted(rows, key=lambda r: (r.get(field) or "", r["id"]))
+        page = self._page(rows, qs)
+        #image urls point back at this server
+        page["results"] = [
+            dict(r, image={k: self.base_url + v for k, v in r["image"].items()})
+            for r in page["results"]
+        ]
+        return page
+
+    def _volumes(self, qs: Dict[str, str]) -> Dict[str, Any]:
+        filt = self._filters(qs.get("filter", ""))
+        rows = list(self.volumes.values())
+        if "id" in filt:
+            ids = {int(x) for x in filt["id"].replace("|", ",").split(",") if x}
+            rows = [r for r in rows if r["id"] in ids]
+        if "date_last_updated" in filt:
+            lo, hi = filt["date_last_updated"].split("|")
+            rows = [r for r in rows if lo[:10] <= r["date_last_updated"][:10] <= hi[:10]]
+        return self._page(rows, qs)
+
+    def _page(self, rows: List[Dict[str, Any]], qs: Dict[str, str]) -> Dict[str, Any]:
+        offset = int(qs.get("offset", 0))
+        limit = min(int(qs.get("limit", self.max_page)), self.max_page)
+        return {
+            "status_code": 1,
+            "error": "OK",
+            "number_of_total_results": len(rows),
+            "number_of_page_results": len(rows[offset:offset + limit]),
+            "results": rows[offset:offset + limit],
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, ctype: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                u = urlparse(self.path)
+                qs = {k: v[0] for k, v in parse_qs(u.query).items()}
+                path = u.path.rstrip("/")
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if path.endswith("/issues"):
+                    kind, payload = "issues", fake._issues(qs)
+                elif path.endswith("/volumes"):
+                    kind, payload = "volumes", fake._volumes(qs)
+                elif path.startswith("/img/"):
+                    with fake._lock:
+                        fake.calls["img"] += 1
+                    self._send(200, b"\xff\xd8\xff\xe0fake-jpeg" + path.encode(), "image/jpeg")
+                    return
+                else:
+                    self._send(404, b"{}", "application/json")
+                    return
+                with fake._lock:
+                    fake.calls[kind] += 1
+                self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+        return Handler
+
+    #--- lifecycle ----------------------------------------------------------
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a background thread; returns the base url."""
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f"http://{host}:{self._server.server_address[1]}"
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fake ComicVine API for benchmarks")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--issues", type=int, default=5000)
+    ap.add_argument("--volumes", type=int, default=400)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--max-page", type=int, default=100)
+    args = ap.parse_args()
+    fake = FakeComicVine(
+        issues=args.issues, volumes=args.volumes, days=args.days,
+        latency_ms=args.latency_ms, max_page=args.max_page,
+    )
+    url = fake.start(args.host, args.port)
+    print(f"Fake ComicVine on {url} ({args.issues} issues, {args.volumes} volumes)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#gen_catalog.py
+#fills the database at DATABASE_URL with a synthetic Comic catalog
+#(weekly Wednesday releases, ~40 series per week, multi-KB descriptions)
+#
+#  DATABASE_URL=sqlite:////tmp/bench.db python -m bench.gen_catalog --rows 100000
+from __future__ import annotations
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List
+
+SERIES_WORDS = [
+    "Amazing", "Uncanny", "Ultimate", "Savage", "Mighty", "Spectacular", "Immortal",
+    "Spider-Man", "X-Men", "Avengers", "Fantastic Four", "Daredevil", "Thor",
+    "Hulk", "Wolverine", "Black Panther", "Captain America", "Iron Man", "Venom",
+]
+
+#deterministic rows for a catalog of `rows` issues starting at `start`
+def generate(rows: int, *, start: date = date(2015, 1, 7), per_week: int = 40,
+             description_bytes: int = 1500, seed: int = 1) -> Iterator[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    series = [
+        f"{rnd.choice(SERIES_WORDS[:7])} {rnd.choice(SERIES_WORDS[7:])}" + (f" ({2000 + i % 25})" if i % 3 else "")
+        for i in range(max(50, rows // 60))
+    ]
+    filler = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (description_bytes // 56 + 1))[:description_bytes]
+    for n in range(rows):
+        week = n // per_week
+        name = series[rnd.randrange(len(series))]
+        yield {
+            "marvel_id": 1_000_000 + n,
+            "title": f"{name} #{rnd.randint(1, 150)}",
+            "author": None,
+            "onsale_date": start + timedelta(weeks=week),
+            "format": "Comic",
+            "thumbnail_url": f"https://example.invalid/covers/{n}.jpg",
+            "description": f"<p>{filler}</p>",
+            "issue_number": str(rnd.randint(1, 150)),
+        }
+
+def _chunks(it: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    buf: List[Dict[str, Any]] = []
+    for row in it:
+        buf.append(row)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+#returns (rows written, seconds, last onsale_date)
+def load(rows: int, *, chunk: int = 5000, **kwargs: Any) -> Dict[str, Any]:
+    from app.db import engine, init_db
+    from app.descriptions import columns
+    from app.models import Comic
+
+    init_db()
+    t0 = time.perf_counter()
+    last = None
+    with engine.begin() as conn:
+        for batch in _chunks(generate(rows, **kwargs), chunk):
+            #stored the way a sync stores them (text summary + compressed HTML)
+            for row in batch:
+                row.update(columns(row["description"]))
+            conn.execute(Comic.__table__.insert(), batch)
+            last = batch[-1]["onsale_date"]
+    return {"rows": rows, "seconds": round(time.perf_counter() - t0, 3), "last_onsale_date": last}
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Generate a synthetic comic catalog")
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--per-week", type=int, default=40)
+    ap.add_argument("--description-bytes", type=int, default=1500)
+    args = ap.parse_args()
+    out = load(args.rows, per_week=args.per_week, description_bytes=args.description_bytes)
+    print(f"Inserted {out['rows']} rows in {out['seconds']}s (through {out['last_onsale_date']})")
+
+if __name__ == "__main__":
+    main()
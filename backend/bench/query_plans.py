@@ -0,0 +1,114 @@
+#query_plans.py
+#query-plan regression check for the read routes: calls each route on a small
+#synthetic catalog, records every SELECT it runs, and asks SQLite for the
+#EXPLAIN QUERY PLAN of each. exits 1 if a query reads a whole table without
+#an index (SCAN <table>) or sorts in a temp B-tree. the exception is sorting
+#FTS matches by bm25 rank (paged or not): the matches come out of comic_fts
+#in rowid order, so ordering them always takes a sort
+#
+#  cd backend
+#  python -m bench.query_plans          # -v prints every plan
+from __future__ import annotations
+import argparse
+import os
+import re
+import sys
+import tempfile
+from typing import Any, List, Tuple
+
+#routes and parameters that cover each query shape the read routes build
+ROUTES = [
+    "/api/comics?limit=200",
+    "/api/comics?start=2015-03-04&end=2015-06-02&limit=50",
+    "/api/comics?page=2&limit=30",
+    "/api/comics?start=2015-03-04&end=2015-06-02&page=2&limit=30",
+    "/api/comics?q=spider&limit=20",
+    "/api/comics/week?wed=2015-01-07",
+    "/api/comics/week?wed=2015-01-07&page=2&limit=10",
+    "/api/comics/weeks?wed=2015-01-07&wed=2015-02-04&wed=2015-03-04",
+    "/api/comics/search?q=amazing",
+    "/api/comics/search?q=amazing&page=2&limit=7",
+    "/api/calendar?start=2015-01-01&end=2015-12-31",
+    "/api/comics/suggest?q=sp",
+    "/api/comics/export?start=2015-01-01&end=2015-02-01",
+    "/api/comics/1",
+]
+#cursor pages are followed from the first page of these
+CURSOR_ROUTES = [
+    "/api/comics?page=1&limit=30",
+    "/api/comics/week?wed=2015-01-07&page=1&limit=10",
+    "/api/comics/search?q=amazing&page=1&limit=7",
+]
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+#problems in one plan (a list of EXPLAIN QUERY PLAN detail strings)
+def violations(plan: List[str]) -> List[str]:
+    fts = any("VIRTUAL TABLE" in step for step in plan)
+    out = []
+    for step in plan:
+        if _FULL_SCAN.match(step):
+            out.append(f"full scan: {step}")
+        elif "USE TEMP B-TREE" in step and not fts:
+            out.append(f"temp sort: {step}")
+    return out
+
+def check(verbose: bool = False) -> int:
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from .gen_catalog import load
+    from app.db import async_engine, engine
+    from app.main import app
+
+    load(2000, per_week=40)
+    captured: List[Tuple[str, Any]] = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    for e in (engine, async_engine.sync_engine if async_engine is not None else None):
+        if e is not None:
+            event.listen(e, "before_cursor_execute", _capture)
+
+    failures = 0
+    with TestClient(app) as client:
+        calls = list(ROUTES)
+        for path in CURSOR_ROUTES:
+            cursor = client.get(path).json()["next_cursor"]
+            calls.append(path.replace("page=1", f"cursor={cursor}"))
+        for path in calls:
+            captured.clear()
+            r = client.get(path)
+            if r.status_code >= 400:
+                print(f"FAIL {path}: HTTP {r.status_code}")
+                failures += 1
+                continue
+            with engine.connect() as conn:
+                for statement, parameters in captured:
+                    plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+                    problems = violations(plan)
+                    failures += bool(problems)
+                    if problems or verbose:
+                        print(f"{'FAIL' if problems else 'ok  '} {path}")
+                        print("     " + " ".join(statement.split())[:160])
+                        for step in plan:
+                            print("       " + step)
+                        for p in problems:
+                            print("     ! " + p)
+    print(f"{len(calls)} requests checked, {failures} problem(s)")
+    return 1 if failures else 0
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN check for the read routes")
+    ap.add_argument("-v", "--verbose", action="store_true", help="print every plan, not just failures")
+    args = ap.parse_args()
+
+    from .run import _isolated_env
+    tmp = tempfile.mkdtemp(prefix="cf-plans-")
+    #no ComicVine here: an empty week must not start a real sync
+    _isolated_env(os.path.join(tmp, "plans.db"), CV_BASE_URL="http://127.0.0.1:9", SYNC_FRESHNESS_HOURS="1e9")
+    sys.exit(check(verbose=args.verbose))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#run.py
+#offline benchmarks: ComicVine sync throughput against the fake server, and
+#latency of the list routes under concurrent load on a synthetic catalog
+#every command prints one JSON document (or writes it with --out) so runs can
+#be diffed with `compare`
+#
+#  cd backend
+#  python -m bench.run all --rows 100000 --out bench-$(git rev-parse --short HEAD).json
+#  python -m bench.run sync --issues 20000 --latency-ms 80
+#  python -m bench.run routes --rows 1000000 --concurrency 16 --requests 2000
+#  python -m bench.run compare old.json new.json --threshold 10
+#
+#app modules read their settings from the environment at import time, so each
+#benchmark runs in its own process with its own temporary database
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+def _isolated_env(db_path: str, **extra: str) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("CV_API_KEY", "bench")
+    os.environ["COVER_PREFETCH"] = "0"
+    os.environ["COVER_CACHE_DIR"] = str(Path(db_path).parent / "covers")
+    #the fake server has no hourly budget; don't let the real one slow the run down
+    os.environ["CV_RATE_PER_HOUR"] = "0"
+    os.environ["CV_RATE_DB"] = str(Path(db_path).parent / "ratelimit.db")
+    os.environ.update(extra)
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    def pct(p: float) -> float:
+        return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+    return {
+        "count": len(s),
+        "mean_ms": round(statistics.fmean(s) * 1000, 3),
+        "p50_ms": round(pct(50) * 1000, 3),
+        "p90_ms": round(pct(90) * 1000, 3),
+        "p99_ms": round(pct(99) * 1000, 3),
+        "max_ms": round(s[-1] * 1000, 3),
+    }
+
+#--- sync throughput ----------------------------------------------------------
+def bench_sync(args: argparse.Namespace) -> Dict[str, Any]:
+    from .fake_comicvine import FakeComicVine
+
+    tmp = tempfile.mkdtemp(prefix="cf-bench-sync-")
+    fake = FakeComicVine(
+        issues=args.issues, volumes=args.volumes, days=args.days, latency_ms=args.latency_ms,
+    )
+    base = fake.start()
+    #the fake catalog's volumes were all updated at the start of 2025: let the volume index reach them
+    _isolated_env(
+        os.path.join(tmp, "sync.db"), CV_BASE_URL=base, CV_CONCURRENCY=str(args.concurrency),
+        SYNC_MODE=args.mode, CV_VOLUME_BOOTSTRAP_DAYS="36500",
+    )
+
+    from app.db import init_db
+    from app.services import cv_sync_range
+
+    init_db()
+    start = date(2025, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+    t0 = time.perf_counter()
+    run = cv_sync_range(start.isoformat(), end.isoformat(), full=True)
+    seconds = time.perf_counter() - t0
+    fake.stop()
+
+    issues = sum(p["issues"] for p in run.passes)
+    calls = fake.calls["issues"] + fake.calls["volumes"]
+    return {
+        "issues": args.issues,
+        "latency_ms": args.latency_ms,
+        "concurrency": args.concurrency,
+        "mode": args.mode,
+        "seconds": round(seconds, 3),
+        "issues_processed": issues,
+        "issues_per_sec": round(issues / seconds, 1) if seconds else None,
+        "api_calls": {"issues": fake.calls["issues"], "volumes": fake.calls["volumes"], "total": calls},
+        "api_calls_per_issue": round(calls / issues, 4) if issues else None,
+        "rows_inserted": run.inserted,
+        "rows_updated": run.updated,
+    }
+
+#--- route latency ------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _load(base: str, make_path: Callable[[random.Random], str], *, requests_n: int,
+          concurrency: int, seed: int) -> Dict[str, Any]:
+    import requests
+
+    local = threading.local()
+    rnd = random.Random(seed)
+    paths = [make_path(rnd) for _ in range(requests_n)]
+    errors = 0
+    lock = threading.Lock()
+
+    def one(path: str) -> float:
+        nonlocal errors
+        if not hasattr(local, "s"):
+            local.s = requests.Session()
+        t = time.perf_counter()
+        r = local.s.get(base + path, timeout=60)
+        elapsed = time.perf_counter() - t
+        if r.status_code >= 400:
+            with lock:
+                errors += 1
+        return elapsed
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        samples = list(ex.map(one, paths))
+    wall = time.perf_counter() - t0
+    out = _percentiles(samples)
+    out["errors"] = errors
+    out["rps"] = round(len(samples) / wall, 1)
+    return out
+
+def bench_routes(args: argparse.Namespace) -> Dict[str, Any]:
+    tmp = tempfile.mkdtemp(prefix="cf-bench-routes-")
+    #no ComicVine here: empty weeks must not start real syncs
+    _isolated_env(os.path.join(tmp, "routes.db"), CV_BASE_URL="http://127.0.0.1:9", SYNC_FRESHNESS_HOURS="1e9")
+
+    import uvicorn
+    from .gen_catalog import SERIES_WORDS, load
+    from app.main import app
+
+    catalog = load(args.rows, per_week=args.per_week)
+    first = date(2015, 1, 7)
+    weeks = max(1, args.rows // args.per_week)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base = f"http://127.0.0.1:{port}"
+
+    def week(rnd: random.Random) -> str:
+        return f"/api/comics/week?wed={first + timedelta(weeks=rnd.randrange(weeks))}"
+
+    def search(rnd: random.Random) -> str:
+        return f"/api/comics/search?q={rnd.choice(SERIES_WORDS)[:rnd.randint(3, 6)]}"
+
+    def comics(rnd: random.Random) -> str:
+        s = first + timedelta(weeks=rnd.randrange(weeks))
+        return f"/api/comics?start={s}&end={s + timedelta(weeks=4)}&limit=100"
+
+    results: Dict[str, Any] = {"catalog": catalog, "concurrency": args.concurrency, "routes": {}}
+    for name, fn in (("/api/comics/week", week), ("/api/comics/search", search), ("/api/comics", comics)):
+        _load(base, fn, requests_n=min(50, args.requests), concurrency=args.concurrency, seed=0)  # warm-up
+        results["routes"][name] = _load(
+            base, fn, requests_n=args.requests, concurrency=args.concurrency, seed=args.seed,
+        )
+    server.should_exit = True
+    return results
+
+#--- orchestration ------------------------------------------------------------
+def _meta() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        rev = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+#runs one benchmark in a fresh process (results go through a file, the app may print)
+def _child(cmd: str, argv: List[str]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "result.json")
+        subprocess.run([sys.executable, "-m", "bench.run", cmd, *argv, "--out", out], cwd=BACKEND, check=True)
+        return json.loads(Path(out).read_text())
+
+def bench_all(args: argparse.Namespace) -> Dict[str, Any]:
+    sync_argv = ["--issues", str(args.issues), "--volumes", str(args.volumes), "--days", str(args.days),
+                 "--latency-ms", str(args.latency_ms), "--concurrency", str(args.cv_concurrency),
+                 "--mode", args.mode]
+    route_argv = ["--rows", str(args.rows), "--per-week", str(args.per_week), "--requests", str(args.requests),
+                  "--concurrency", str(args.concurrency), "--seed", str(args.seed)]
+    return {"sync": _child("sync", sync_argv)["sync"], "routes": _child("routes", route_argv)["routes"]}
+
+#flattens {"a": {"b": 1}} -> {"a.b": 1} for comparing numbers
+def _flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+#metrics where a bigger number is better; everything timed in ms/seconds is lower-is-better
+HIGHER_IS_BETTER = ("issues_per_sec", "rps")
+
+def compare(args: argparse.Namespace) -> int:
+    old = _flatten(json.loads(Path(args.old).read_text()))
+    new = _flatten(json.loads(Path(args.new).read_text()))
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        if not (key.endswith(("_ms", "seconds", "api_calls_per_issue")) or key.endswith(HIGHER_IS_BETTER)):
+            continue
+        a, b = old[key], new[key]
+        if a == 0:
+            continue
+        change = (b - a) / a * 100
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        flag = "REGRESSION" if worse > args.threshold else ""
+        regressions += bool(flag)
+        print(f"{key:60s} {a:12.3f} -> {b:12.3f}  {change:+7.1f}%  {flag}")
+    return 1 if regressions else 0
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Comic Finder offline benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def sync_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--issues", type=int, default=5000)
+        p.add_argument("--volumes", type=int, default=400)
+        p.add_argument("--days", type=int, default=180)
+        p.add_argument("--latency-ms", type=float, default=50.0)
+        p.add_argument("--mode", choices=("full", "targeted"), default="full", help="SYNC_MODE")
+
+    def route_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--rows", type=int, default=10_000)
+        p.add_argument("--per-week", type=int, default=40)
+        p.add_argument("--requests", type=int, default=500)
+        p.add_argument("--seed", type=int, default=1)
+
+    p = sub.add_parser("sync", help="sync throughput against the fake ComicVine")
+    sync_args(p)
+    p.add_argument("--concurrency", type=int, default=4, help="CV_CONCURRENCY")
+    p = sub.add_parser("routes", help="list route latency under load")
+    route_args(p)
+    p.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    p = sub.add_parser("all", help="sync + routes")
+    sync_args(p)
+    route_args(p)
+    p.add_argument("--cv-concurrency", type=int, default=4)
+    p.add_argument("--concurrency", type=int, default=8)
+    for p in sub.choices.values():
+        p.add_argument("--out", help="write JSON here instead of stdout")
+    p = sub.add_parser("compare", help="diff two result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    args = ap.parse_args()
+
+    if args.cmd == "compare":
+        sys.exit(compare(args))
+    if args.cmd == "sync":
+        body = {"sync": bench_sync(args)}
+    elif args.cmd == "routes":
+        body = {"routes": bench_routes(args)}
+    else:
+        body = bench_all(args)
+    result = {"meta": _meta(), **body}
+    text = json.dumps(result, indent=2, default=str)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
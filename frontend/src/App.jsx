@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 
 //helper functions
 const pad = (n) => String(n).padStart(2, "0");
@@ -19,6 +19,11 @@ function addDays(d, n) {
   x.setDate(x.getDate() + n);
   return x;
 }
+// if the cover proxy fails (ie. 502), fall back to the hot-linked thumbnail once
+function coverFallback(e, thumbnailUrl) {
+  const img = e.currentTarget;
+  if (thumbnailUrl && img.src !== thumbnailUrl) img.src = thumbnailUrl;
+}
 
 // UI
 function Spinner() {
@@ -70,6 +75,8 @@ export default function App() {
   const [loading, setLoading] = useState(false);
   const [err, setErr] = useState("");
   const [selected, setSelected] = useState(null); // comic for modal
+  // next_cursor returned for each page, so page N+1 is fetched by keyset
+  const cursors = useRef({});
 
   const totalPages = useMemo(
     () => Math.max(1, Math.ceil(total / pageSize)),
@@ -88,23 +95,52 @@ export default function App() {
     return url.toString();
   };
 
+  // Paging params for page p: the saved cursor if we have one, else the page number
+  const pageParams = (p) => {
+    if (p === 1) cursors.current = {};
+    const cursor = cursors.current[p];
+    return cursor ? { cursor, limit: pageSize } : { page: p, limit: pageSize };
+  };
+  const rememberCursor = (p, data) => {
+    if (data && data.next_cursor) cursors.current[p + 1] = data.next_cursor;
+  };
+
+  // Poll a background sync job until it finishes (true if it succeeded)
+  const waitForJob = async (jobId, timeoutMs = 120000) => {
+    const until = Date.now() + timeoutMs;
+    while (Date.now() < until) {
+      await new Promise((r) => setTimeout(r, 1500));
+      const res = await fetch(api(`/jobs/${jobId}`));
+      if (!res.ok) return false;
+      const job = await res.json();
+      if (job.status === "done") return true;
+      if (job.status === "failed") return false;
+    }
+    return false;
+  };
+
   // Fetch (week)
-  const fetchWeek = async (w, p = 1) => {
+  const fetchWeek = async (w, p = 1, afterSync = false) => {
     setLoading(true);
     setErr("");
     try {
       const res = await fetch(
         api("/comics/week", {
           wed: fmtISO(w),
-          page: p,
-          limit: pageSize,
+          ...pageParams(p),
         })
       );
+      // 202: week was empty, backend is syncing that month in the background
+      const jobId = res.status === 202 && res.headers.get("X-Sync-Job");
+      if (jobId && !afterSync) {
+        if (await waitForJob(jobId)) return fetchWeek(w, p, true);
+      }
       if (!res.ok) {
         const t = await res.text();
         throw new Error(`HTTP ${res.status}${t ? ` — ${t}` : ""}`);
       }
       const data = await res.json();
+      rememberCursor(p, data);
       setRows(data.items || data); // backend returns {items, total}? support both
       setTotal(Number(data.total ?? data.length ?? 0));
     } catch (e) {
@@ -131,8 +167,7 @@ export default function App() {
         const res = await fetch(
           api("/comics/search", {
             q: clean, // URL helper encodes
-            page: p,
-            limit: pageSize,
+            ...pageParams(p),
           })
         );
         if (!res.ok) {
@@ -140,6 +175,7 @@ export default function App() {
           throw new Error(`HTTP ${res.status}${t ? ` — ${t}` : ""}`);
         }
         const data = await res.json();
+        rememberCursor(p, data);
         setRows(data.items || data);
         setTotal(Number(data.total ?? data.length ?? 0));
       }
@@ -160,6 +196,32 @@ export default function App() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  // Series suggestions while typing (debounced, small in-memory lookup on the server)
+  const [suggestions, setSuggestions] = useState([]);
+  useEffect(() => {
+    const text = q.trim();
+    if (!text) {
+      setSuggestions([]);
+      return;
+    }
+    const ctrl = new AbortController();
+    const t = setTimeout(async () => {
+      try {
+        const res = await fetch(api("/comics/suggest", { q: text, limit: 8 }), {
+          signal: ctrl.signal,
+        });
+        if (res.ok) setSuggestions(await res.json());
+      } catch {
+        // aborted or offline: keep the previous list
+      }
+    }, 120);
+    return () => {
+      clearTimeout(t);
+      ctrl.abort();
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [q]);
+
   // When mode/page/wed/q changes, refetch
   useEffect(() => {
     if (mode === "week") {
@@ -196,6 +258,20 @@ export default function App() {
     fetchWeek(wed, 1);
   };
 
+  // Open the modal with the card right away, then load the full record
+  // (list routes don't send descriptions)
+  const openComic = async (c) => {
+    setSelected(c);
+    try {
+      const res = await fetch(api(`/comics/${c.id}`));
+      if (!res.ok) return;
+      const full = await res.json();
+      setSelected((cur) => (cur && cur.id === full.id ? full : cur));
+    } catch {
+      // keep showing the card data
+    }
+  };
+
   // Format helpers
   const weekLabel = useMemo(() => {
     const end = addDays(wed, 6);
@@ -224,7 +300,15 @@ export default function App() {
             onChange={(e) => setQ(e.target.value)}
             placeholder="Search by title (e.g., Daredevil)"
             aria-label="Search by title"
+            list="series-suggestions"
           />
+          <datalist id="series-suggestions">
+            {suggestions.map((sg) => (
+              <option key={sg.series} value={sg.series}>
+                {`${sg.count} issues`}
+              </option>
+            ))}
+          </datalist>
           <button className="btn" type="submit">
             Search
           </button>
@@ -273,14 +357,15 @@ export default function App() {
           <article
             key={c.id}
             className="card"
-            onClick={() => setSelected(c)}
+            onClick={() => openComic(c)}
             title={c.title}
             role="button"
           >
             <div className="thumbwrap">
               {c.thumbnail_url ? (
                 <img
-                  src={c.thumbnail_url}
+                  src={c.cover_url || c.thumbnail_url}
+                  onError={(e) => coverFallback(e, c.thumbnail_url)}
                   alt={c.title}
                   loading="lazy"
                   referrerPolicy="no-referrer"
@@ -338,7 +423,8 @@ export default function App() {
           <div className="detail-thumb">
             {selected?.thumbnail_url ? (
               <img
-                src={selected.thumbnail_url}
+                src={selected.cover_url || selected.thumbnail_url}
+                onError={(e) => coverFallback(e, selected.thumbnail_url)}
                 alt={selected.title}
                 loading="lazy"
                 referrerPolicy="no-referrer"
@@ -354,15 +440,17 @@ export default function App() {
                 : "—"}{" "}
               • {selected?.format || "Comic"}
             </div>
-            <div
-              className="detail-desc"
-              // Backend sends HTML (ComicVine). Safe-ish for this controlled demo.
-              dangerouslySetInnerHTML={{
-                __html:
-                  selected?.description ||
-                  "<em>No description provided.</em>",
-              }}
-            />
+            {selected?.description_html ? (
+              <div
+                className="detail-desc"
+                // Backend sends the original ComicVine HTML. Safe-ish for this controlled demo.
+                dangerouslySetInnerHTML={{ __html: selected.description_html }}
+              />
+            ) : (
+              <div className="detail-desc" style={{ whiteSpace: "pre-line" }}>
+                {selected?.description || <em>No description provided.</em>}
+              </div>
+            )}
           </div>
         </div>
       </Modal>